@@ -0,0 +1,112 @@
+"""
+Benchmark keyword categorization: sequential substring scan vs the Aho-Corasick automaton,
+the automaton behind the normalized merchant cache, and the vectorized whole-word regex mode.
+
+    python bench_categorizer.py --rows 1000000 --keywords 1000 --merchants 5000
+"""
+import argparse
+import random
+import string
+import time
+import pandas as pd
+from categorizer import (
+    KeywordAutomaton, MerchantCategoryCache, categorize_series, compile_category_patterns, normalize_merchant
+)
+from main import CATEGORY_KEYWORDS
+
+def naive_categorize(category_keywords, description):
+    """The original categorize_transaction: every keyword of every category in turn"""
+    desc_lower = description.lower()
+    for category, keywords in category_keywords.items():
+        if any(keyword in desc_lower for keyword in keywords):
+            return category
+    return 'Other'
+
+def build_keywords(total, rng):
+    """CATEGORY_KEYWORDS padded with synthetic merchant names up to `total` keywords"""
+    keywords = {category: list(words) for category, words in CATEGORY_KEYWORDS.items()}
+    categories = [category for category in keywords if category != 'Other']
+    existing = {word for words in keywords.values() for word in words}
+    while len(existing) < total:
+        word = ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 9)))
+        if word not in existing:
+            existing.add(word)
+            keywords[rng.choice(categories)].append(word)
+    return keywords
+
+def build_descriptions(keywords, rows, merchants, rng):
+    """Bank-feed style descriptions from a fixed merchant population; roughly a third match no keyword.
+
+    Each merchant has one feed prefix and a handful of store numbers, so the
+    same merchant recurs with varying suffixes as in a real export.
+    """
+    vocabulary = [word for words in keywords.values() for word in words]
+    filler = ['POS', 'DEBIT', 'CARD', 'ONLINE', 'INTL', 'REF', 'TXN', 'PURCHASE AUTH']
+    population = []
+    for _ in range(merchants):
+        if rng.random() < 0.66:
+            name = rng.choice(vocabulary).upper()
+        else:
+            name = ''.join(rng.choices(string.ascii_uppercase, k=rng.randint(4, 10)))
+        stores = [rng.randint(1000, 9999) for _ in range(rng.randint(1, 10))]
+        population.append((rng.choice(filler), name, stores))
+    descriptions = []
+    for _ in range(rows):
+        prefix, name, stores = rng.choice(population)
+        descriptions.append(f'{prefix} {name} #{rng.choice(stores)}')
+    return pd.Series(descriptions)
+
+def memoized_categorize(cache, descriptions):
+    """main.categorize_descriptions: each distinct merchant once, broadcast back with map"""
+    merchants = {description: normalize_merchant(description) for description in descriptions.unique()}
+    categories, _, _ = cache.categorize_many(set(merchants.values()))
+    return descriptions.map({description: categories[merchant] for description, merchant in merchants.items()})
+
+def timed(label, func, rows):
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    print(f'{label:12} {elapsed:8.2f}s  {rows / elapsed:12,.0f} rows/s')
+    return result, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Keyword categorization benchmark')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--keywords', type=int, default=1000)
+    parser.add_argument('--merchants', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    keywords = build_keywords(args.keywords, rng)
+    descriptions = build_descriptions(keywords, args.rows, args.merchants, rng)
+    print(
+        f'{args.rows:,} descriptions ({descriptions.nunique():,} distinct), '
+        f'{sum(len(words) for words in keywords.values()):,} keywords'
+    )
+
+    started = time.perf_counter()
+    automaton = KeywordAutomaton(keywords)
+    print(f'automaton built in {(time.perf_counter() - started) * 1000:.1f}ms')
+
+    naive, naive_time = timed('sequential', lambda: descriptions.apply(lambda d: naive_categorize(keywords, d)), args.rows)
+    fast, fast_time = timed('automaton', lambda: descriptions.apply(automaton.categorize), args.rows)
+    cache = MerchantCategoryCache(automaton)
+    memo, memo_time = timed('memoized', lambda: memoized_categorize(cache, descriptions), args.rows)
+    print(f'{len(cache):,} distinct merchants cached')
+    patterns = compile_category_patterns(keywords)
+    vectorized, vectorized_time = timed('vectorized', lambda: categorize_series(descriptions, patterns), args.rows)
+
+    failed = False
+    for label, result, elapsed in (('automaton', fast, fast_time), ('memoized', memo, memo_time)):
+        mismatches = int((naive != result).sum())
+        print(f'{label}: speedup {naive_time / elapsed:.1f}x, {mismatches} mismatching categories')
+        failed = failed or bool(mismatches)
+    # Whole-word matching is intentionally stricter, so differences are reported rather than failed
+    differing = int((naive != vectorized).sum())
+    print(f'vectorized: speedup {naive_time / vectorized_time:.1f}x, {differing} rows differ (whole-word matching)')
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+from collections import OrderedDict, deque
+import re
+import threading
+from typing import Dict, Iterable, List, Tuple
+import pandas as pd
+
+# Noise that varies between charges at the same merchant
+MERCHANT_NOISE = re.compile(
+    r'\b\d{1,4}[/.-]\d{1,2}(?:[/.-]\d{2,4})?\b'                                 # dates: 2024-01-15, 01/15/24, 15.01
+    r'|\b\d{1,2}(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)\w*'         # dates: 15JAN, 03Mar24
+    r'|\b(?:card|acct)?\s*(?:ending(?:\s+in)?|no\.?)\s*\d+'                     # card suffixes: CARD ENDING 1234
+    r'|\bx{2,}\d*\b|\*+\d+'                                                     # masked numbers: XXXX1234, ****1234, *1234
+    r'|#\s*\d+'                                                                 # store numbers: #1234
+    r'|\b\d+\b'                                                                 # any other standalone number
+)
+SEPARATORS = re.compile(r'[\s*#:/-]+')
+
+def normalize_merchant(description: str) -> str:
+    """Lowercase description with store numbers, card suffixes and dates removed.
+
+    "STARBUCKS #1234 01/15" and "Starbucks #988" both become "starbucks".
+    """
+    text = MERCHANT_NOISE.sub(' ', description.lower())
+    return SEPARATORS.sub(' ', text).strip()
+
+def _trie_alternation(words: List[str]) -> str:
+    """Regex alternation of words with shared prefixes factored out ("uber|ubereats" -> "uber(?:eats)?").
+
+    Python's re tries alternatives one by one, so factoring the prefixes
+    keeps matching from rescanning the same characters for every keyword.
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def emit(node):
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            body = f'(?:{body})?'
+        return body
+
+    return emit(trie)
+
+def compile_category_patterns(category_keywords: Dict[str, List[str]]) -> Dict[str, re.Pattern]:
+    """One regex per category matching any of its keywords as a whole word; categories without keywords are skipped"""
+    return {
+        category: re.compile(rf'(?<![a-z0-9]){_trie_alternation([k.lower() for k in keywords])}(?![a-z0-9])')
+        for category, keywords in category_keywords.items() if keywords
+    }
+
+def categorize_series(descriptions: pd.Series, patterns: Dict[str, re.Pattern], default: str = 'Other') -> pd.Series:
+    """Vectorized categorization: each pattern in priority order claims the rows no earlier category matched"""
+    lowered = descriptions.str.lower()
+    categories = pd.Series(default, index=descriptions.index, dtype=object)
+    pending = pd.Series(True, index=descriptions.index)
+    for category, pattern in patterns.items():
+        if not pending.any():
+            break
+        matched = lowered[pending].str.contains(pattern, na=False)
+        matched = matched[matched].index
+        categories[matched] = category
+        pending[matched] = False
+    return categories
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton over category keywords.
+
+    Finds every keyword occurring in a description in one pass over its
+    characters. When several categories match, the one listed first in the
+    keyword mapping wins, as with a sequential scan over the categories.
+    """
+
+    def __init__(self, category_keywords: Dict[str, List[str]], default: str = 'Other'):
+        self.default = default
+        self.categories = list(category_keywords)
+        no_match = len(self.categories)
+
+        # Trie of every keyword; each state remembers the best (lowest) category priority ending there
+        goto: List[Dict[str, int]] = [{}]
+        best = [no_match]
+        for priority, keywords in enumerate(category_keywords.values()):
+            for keyword in keywords:
+                state = 0
+                for char in keyword.lower():
+                    if char not in goto[state]:
+                        goto.append({})
+                        best.append(no_match)
+                        goto[state][char] = len(goto) - 1
+                    state = goto[state][char]
+                best[state] = min(best[state], priority)
+
+        # Breadth-first failure links, folded into a complete transition table so
+        # matching is a single dict lookup per character
+        alphabet = {char for edges in goto for char in edges}
+        delta: List[Dict[str, int]] = [dict() for _ in goto]
+        fail = [0] * len(goto)
+        queue = deque()
+        for char in alphabet:
+            target = goto[0].get(char, 0)
+            delta[0][char] = target
+            if target:
+                queue.append(target)
+        while queue:
+            state = queue.popleft()
+            best[state] = min(best[state], best[fail[state]])
+            for char in alphabet:
+                target = goto[state].get(char)
+                if target is None:
+                    delta[state][char] = delta[fail[state]][char]
+                else:
+                    fail[target] = delta[fail[state]][char]
+                    delta[state][char] = target
+                    queue.append(target)
+
+        # Characters outside the alphabet always lead back to the root
+        self._delta = [{char: target for char, target in edges.items() if target} for edges in delta]
+        self._best = best
+        self._no_match = no_match
+
+    def priority(self, text: str) -> int:
+        """Index of the first category with a keyword in text, or len(categories) if none"""
+        delta, best = self._delta, self._best
+        found = self._no_match
+        state = 0
+        for char in text.lower():
+            state = delta[state].get(char, 0)
+            if best[state] < found:
+                found = best[state]
+                if not found:
+                    break
+        return found
+
+    def categorize(self, text: str) -> str:
+        found = self.priority(text)
+        return self.categories[found] if found < self._no_match else self.default
+
+class MerchantCategoryCache:
+    """Bounded LRU cache of normalized merchant -> category in front of a KeywordAutomaton"""
+
+    def __init__(self, automaton: KeywordAutomaton, max_size: int = 10000):
+        self.automaton = automaton
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def categorize_many(self, merchants: Iterable[str]) -> Tuple[Dict[str, str], int, int]:
+        """Categorize distinct normalized merchants; returns (categories, hits, misses) for this call"""
+        categories, hits, misses = {}, 0, 0
+        with self._lock:
+            for merchant in merchants:
+                category = self._entries.get(merchant)
+                if category is None:
+                    category = self.automaton.categorize(merchant)
+                    self._entries[merchant] = category
+                    if len(self._entries) > self.max_size:
+                        self._entries.popitem(last=False)
+                    misses += 1
+                else:
+                    self._entries.move_to_end(merchant)
+                    hits += 1
+                categories[merchant] = category
+            self.hits += hits
+            self.misses += misses
+        return categories, hits, misses
+
+    def categorize(self, description: str) -> str:
+        merchant = normalize_merchant(description)
+        return self.categorize_many([merchant])[0][merchant]
+
+    def __len__(self):
+        return len(self._entries)
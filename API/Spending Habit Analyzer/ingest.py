@@ -0,0 +1,191 @@
+import codecs
+import io
+import json
+from typing import AsyncIterator, Dict, List, Optional
+import pandas as pd
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+ARROW_AVAILABLE = pa is not None
+
+REQUIRED_COLUMNS = ('id', 'description', 'amount', 'date')
+TEXT_COLUMNS = {'description': str, 'date': str, 'category': str}
+
+STREAM_FORMATS = {
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/x-jsonlines': 'ndjson',
+    'text/csv': 'csv',
+}
+
+COLUMNAR_FORMATS = {
+    'application/json': 'json',
+    'application/vnd.apache.arrow.stream': 'arrow',
+    'application/vnd.apache.arrow.file': 'arrow',
+    'application/vnd.apache.parquet': 'parquet',
+    'application/x-parquet': 'parquet',
+    'multipart/form-data': 'upload',
+}
+
+class TransactionValidationError(ValueError):
+    pass
+
+def stream_format(content_type: str) -> Optional[str]:
+    """'ndjson' or 'csv' for a request Content-Type, None if unsupported"""
+    return STREAM_FORMATS.get(content_type.split(';')[0].strip().lower())
+
+def columnar_format(content_type: str) -> Optional[str]:
+    """'json', 'arrow', 'parquet' or 'upload' (multipart file) for a request Content-Type, None if unsupported"""
+    return COLUMNAR_FORMATS.get(content_type.split(';')[0].strip().lower())
+
+def sniff_columnar_format(data: bytes) -> str:
+    """Format of an uploaded file from its magic bytes"""
+    if data[:4] == b'PAR1':
+        return 'parquet'
+    if data.lstrip()[:1] == b'{':
+        return 'json'
+    return 'arrow'
+
+def _rows(mask: pd.Series, first_row: int) -> str:
+    """Describe the offending rows of a failed check, 1-based within the upload"""
+    positions = [first_row + position + 1 for position in mask.to_numpy().nonzero()[0][:5]]
+    more = '' if mask.sum() <= len(positions) else ', ...'
+    return f"row{'s' if len(positions) > 1 else ''} {', '.join(map(str, positions))}{more}"
+
+def validate_transactions(df: pd.DataFrame, first_row: int = 0) -> pd.DataFrame:
+    """Check and coerce a frame of transactions column by column, as the Transaction model would per row.
+
+    Returns a frame with id, description, amount, date and category columns;
+    raises TransactionValidationError naming the first offending rows.
+    """
+    missing = [column for column in REQUIRED_COLUMNS if column not in df.columns]
+    if missing:
+        raise TransactionValidationError(f"missing column(s): {', '.join(missing)}")
+
+    ids = pd.to_numeric(df['id'], errors='coerce')
+    invalid = ids.isna() | (ids % 1 != 0)
+    if invalid.any():
+        raise TransactionValidationError(f"id must be an integer at {_rows(invalid, first_row)}")
+
+    amounts = pd.to_numeric(df['amount'], errors='coerce')
+    invalid = amounts.isna()
+    if invalid.any():
+        raise TransactionValidationError(f"amount must be a number at {_rows(invalid, first_row)}")
+
+    for column in ('description', 'date'):
+        invalid = df[column].isna() | ~df[column].map(type).eq(str)
+        if invalid.any():
+            raise TransactionValidationError(f"{column} must be a string at {_rows(invalid, first_row)}")
+
+    category = df['category'] if 'category' in df.columns else None
+    if category is not None:
+        invalid = category.notna() & ~category.map(type).eq(str)
+        if invalid.any():
+            raise TransactionValidationError(f"category must be a string at {_rows(invalid, first_row)}")
+
+    # copy=False keeps numeric columns that already have the right dtype shared, not copied
+    return pd.DataFrame({
+        'id': ids.astype('int64', copy=False),
+        'description': df['description'],
+        'amount': amounts.astype('float64', copy=False),
+        'date': df['date'],
+        'category': category.astype(object).where(category.notna(), None) if category is not None else None,
+    }, copy=False)
+
+def frame_from_columns(columns: Dict[str, list]) -> pd.DataFrame:
+    """Validated DataFrame from a JSON object of equal-length column arrays"""
+    if not isinstance(columns, dict) or not all(isinstance(values, list) for values in columns.values()):
+        raise TransactionValidationError("expected an object of column arrays")
+    lengths = {name: len(values) for name, values in columns.items()}
+    if len(set(lengths.values())) > 1:
+        raise TransactionValidationError(f"columns differ in length: {lengths}")
+    return validate_transactions(pd.DataFrame(columns))
+
+def frame_from_arrow(data: bytes, fmt: str) -> pd.DataFrame:
+    """Validated DataFrame from an Arrow IPC (stream or file) or Parquet payload.
+
+    Arrow buffers are read in place from the request body, and numeric
+    columns without nulls reach pandas without being copied.
+    """
+    if not ARROW_AVAILABLE:
+        raise RuntimeError("Arrow and Parquet uploads need pyarrow installed")
+    buffer = pa.py_buffer(data)
+    try:
+        if fmt == 'parquet':
+            table = pq.read_table(pa.BufferReader(buffer))
+        elif data[:6] == b'ARROW1':
+            table = pa.ipc.open_file(buffer).read_all()
+        else:
+            table = pa.ipc.open_stream(buffer).read_all()
+    except pa.ArrowException as e:
+        raise TransactionValidationError(f"unreadable {fmt} payload: {e}")
+    return validate_transactions(table.to_pandas(split_blocks=True, self_destruct=True))
+
+def parse_columnar(data: bytes, fmt: str) -> pd.DataFrame:
+    if fmt == 'json':
+        try:
+            columns = json.loads(data)
+        except ValueError as e:
+            raise TransactionValidationError(f"invalid JSON: {e}")
+        return frame_from_columns(columns)
+    return frame_from_arrow(data, fmt)
+
+def parse_ndjson(lines: List[str], first_row: int = 0) -> pd.DataFrame:
+    frame = pd.read_json(io.StringIO('\n'.join(lines)), lines=True, dtype=False, convert_dates=False)
+    return validate_transactions(frame, first_row)
+
+def parse_csv(header: str, lines: List[str], first_row: int = 0) -> pd.DataFrame:
+    frame = pd.read_csv(io.StringIO('\n'.join([header, *lines])), dtype=TEXT_COLUMNS)
+    return validate_transactions(frame, first_row)
+
+async def iter_line_batches(byte_stream: AsyncIterator[bytes], batch_lines: int, quoted: bool = False) -> AsyncIterator[List[str]]:
+    """Group the non-empty lines of a byte stream into lists of about batch_lines.
+
+    With quoted=True a batch never ends inside a double-quoted field, so CSV
+    values containing newlines stay in one batch.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    batch, quotes, pending = [], 0, ''
+
+    async for data in byte_stream:
+        pending += decoder.decode(data)
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            line = line.rstrip('\r')
+            if line or quotes % 2:
+                batch.append(line)
+                quotes += line.count('"') if quoted else 0
+            if len(batch) >= batch_lines and not quotes % 2:
+                yield batch
+                batch, quotes = [], 0
+
+    pending = (pending + decoder.decode(b'', final=True)).rstrip('\r')
+    if pending:
+        batch.append(pending)
+    if batch:
+        yield batch
+
+async def iter_transaction_frames(byte_stream: AsyncIterator[bytes], fmt: str, chunk_rows: int) -> AsyncIterator[pd.DataFrame]:
+    """Validated DataFrames of at most about chunk_rows transactions from an NDJSON or CSV body.
+
+    Only one chunk is held at a time; parsing runs in the threadpool so large
+    uploads do not block the event loop.
+    """
+    header, first_row = None, 0
+    async for lines in iter_line_batches(byte_stream, chunk_rows, quoted=fmt == 'csv'):
+        if fmt == 'csv':
+            if header is None:
+                header, lines = lines[0], lines[1:]
+            if not lines:
+                continue
+            frame = await run_in_threadpool(parse_csv, header, lines, first_row)
+        else:
+            frame = await run_in_threadpool(parse_ndjson, lines, first_row)
+        first_row += len(frame)
+        yield frame
@@ -1,9 +1,16 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Optional
+from fastapi import FastAPI, HTTPException, Query, Request
+from pydantic import BaseModel, Field
+from typing import List, Dict, Literal, Optional, Set, Tuple
 import pandas as pd
 from datetime import datetime
 import re
+from starlette.concurrency import run_in_threadpool
+from categorizer import (
+    KeywordAutomaton, MerchantCategoryCache, categorize_series, compile_category_patterns, normalize_merchant
+)
+from ingest import (
+    ARROW_AVAILABLE, columnar_format, iter_transaction_frames, parse_columnar, sniff_columnar_format, stream_format
+)
 
 app = FastAPI(
     title="Spending Habit Analyzer API",
@@ -28,12 +35,29 @@ class CategorySummary(BaseModel):
     transaction_count: int
     percentage: float
 
+class CategorizationStats(BaseModel):
+    mode: str
+    categorized: int
+    # Merchant cache statistics; not reported by the vectorized mode
+    unique_merchants: Optional[int] = None
+    cache_hits: Optional[int] = None
+    cache_misses: Optional[int] = None
+    hit_rate: Optional[float] = None
+
+class AnalysisMetadata(BaseModel):
+    categorization: Optional[CategorizationStats] = None
+
 class AnalysisResponse(BaseModel):
     total_spent: float
     transaction_count: int
     category_breakdown: List[CategorySummary]
     monthly_trend: Dict[str, float]
     insights: List[str]
+    metadata: AnalysisMetadata = Field(default_factory=AnalysisMetadata)
+
+# Rows parsed and aggregated at a time by /analyze/stream
+STREAM_CHUNK_ROWS = 10000
+STREAM_MAX_CHUNK_ROWS = 100000
 
 # Category mapping based on keywords
 CATEGORY_KEYWORDS = {
@@ -48,61 +72,158 @@ CATEGORY_KEYWORDS = {
     'Other': []
 }
 
+# Built once: matches all keywords in a single pass; earlier categories take priority
+CATEGORY_MATCHER = KeywordAutomaton(CATEGORY_KEYWORDS)
+
+# Normalized merchant -> category, shared across requests
+MERCHANT_CACHE_SIZE = 10000
+MERCHANT_CACHE = MerchantCategoryCache(CATEGORY_MATCHER, max_size=MERCHANT_CACHE_SIZE)
+
 def categorize_transaction(description: str) -> str:
-    desc_lower = description.lower()
-    for category, keywords in CATEGORY_KEYWORDS.items():
-        if any(keyword in desc_lower for keyword in keywords):
-            return category
-    return 'Other'
+    return MERCHANT_CACHE.categorize(description)
+
+def categorize_descriptions(descriptions: pd.Series, seen: Optional[Set[str]] = None) -> Tuple[pd.Series, CategorizationStats]:
+    """Categorize each distinct merchant once and broadcast the result back to every row.
+
+    Merchants in seen (those of earlier chunks of the same upload) are left out
+    of the statistics, so they count each merchant once per upload; new
+    merchants are added to it.
+    """
+    merchants = {description: normalize_merchant(description) for description in descriptions.unique()}
+    distinct = set(merchants.values())
+    new = distinct - seen if seen is not None else distinct
+    categories, hits, misses = MERCHANT_CACHE.categorize_many(new)
+    if len(new) < len(distinct):
+        categories.update(MERCHANT_CACHE.categorize_many(distinct - new)[0])
+    if seen is not None:
+        seen |= new
+    by_description = {description: categories[merchant] for description, merchant in merchants.items()}
+    stats = CategorizationStats(
+        mode='merchant',
+        categorized=len(descriptions),
+        unique_merchants=len(new),
+        cache_hits=hits,
+        cache_misses=misses,
+        hit_rate=round(hits / len(new), 4) if new else 0.0
+    )
+    return descriptions.map(by_description), stats
+
+# Whole-word keyword patterns per category, for vectorized categorization
+CATEGORY_PATTERNS = compile_category_patterns(CATEGORY_KEYWORDS)
+
+CategorizationMode = Literal['merchant', 'vectorized']
+
+def categorize_missing(df: pd.DataFrame, mode: CategorizationMode = 'merchant', seen: Optional[Set[str]] = None) -> Optional[CategorizationStats]:
+    """Fill in the category of rows that arrived without one, leaving provided categories untouched"""
+    missing = df['category'].isna() if 'category' in df.columns else pd.Series(True, index=df.index)
+    if not missing.any():
+        return None
+    descriptions = df.loc[missing, 'description']
+    if mode == 'vectorized':
+        categories = categorize_series(descriptions, CATEGORY_PATTERNS)
+        stats = CategorizationStats(mode=mode, categorized=len(descriptions))
+    else:
+        categories, stats = categorize_descriptions(descriptions, seen)
+    df.loc[missing, 'category'] = categories
+    return stats
+
+class SpendingTotals:
+    """Running aggregates behind an AnalysisResponse.
+
+    Frames can be added in any number of chunks; only per-category and
+    per-month sums, a few counters and the set of distinct merchants are kept,
+    so memory does not grow with the number of transactions.
+    """
+
+    def __init__(self, categorization: CategorizationMode = 'merchant'):
+        self.categorization = categorization
+        self.transaction_count = 0
+        self.total_spent = 0.0
+        self.by_category: Dict[str, List[float]] = {}
+        self.by_month: Dict[str, float] = {}
+        self.months_parsed = True
+        self.large_count = 0
+        self.small_count = 0
+        self.stats: Optional[CategorizationStats] = None
+        self.merchants: Set[str] = set()
+
+    def add(self, df: pd.DataFrame):
+        # Add categories where not present
+        self._merge_stats(categorize_missing(df, self.categorization, self.merchants))
+
+        self.transaction_count += len(df)
+        self.total_spent += df['amount'].sum()
+        for category, (amount, count) in df.groupby('category')['amount'].agg(['sum', 'count']).iterrows():
+            totals = self.by_category.setdefault(category, [0.0, 0])
+            totals[0] += amount
+            totals[1] += int(count)
+
+        # Monthly trend (simplified - using last 7 characters as month identifier)
+        try:
+            for month, amount in df.groupby(df['date'].str[-7:])['amount'].sum().items():  # Extract MM-YYYY part
+                self.by_month[month] = self.by_month.get(month, 0.0) + amount
+        except Exception:
+            # Fallback if date parsing fails
+            self.months_parsed = False
+
+        self.large_count += int((df['amount'] > 500).sum())
+        self.small_count += int((df['amount'] < 10).sum())
+
+    def _merge_stats(self, stats: Optional[CategorizationStats]):
+        if stats is None or self.stats is None:
+            self.stats = self.stats or stats
+            return
+        merged = self.stats
+        merged.categorized += stats.categorized
+        if merged.cache_hits is not None:
+            # Chunks only report merchants new to the upload, so these add up to distinct counts
+            merged.unique_merchants += stats.unique_merchants
+            merged.cache_hits += stats.cache_hits
+            merged.cache_misses += stats.cache_misses
+            lookups = merged.cache_hits + merged.cache_misses
+            merged.hit_rate = round(merged.cache_hits / lookups, 4) if lookups else 0.0
+
+    def response(self) -> AnalysisResponse:
+        total_spent = self.total_spent
+
+        # Category breakdown
+        category_breakdown = []
+        for category, (total_amount, transaction_count) in sorted(self.by_category.items()):
+            total_amount = round(total_amount, 2)
+            percentage = round((total_amount / total_spent) * 100, 2) if total_spent > 0 else 0
+            category_breakdown.append(CategorySummary(
+                category=category,
+                total_amount=total_amount,
+                transaction_count=transaction_count,
+                percentage=percentage
+            ))
+
+        if self.months_parsed:
+            monthly_trend = {month: round(amount, 2) for month, amount in sorted(self.by_month.items())}
+        else:
+            monthly_trend = {"Recent": total_spent}
 
-def analyze_spending_patterns(transactions: List[Transaction]) -> AnalysisResponse:
+        # Generate insights
+        insights = generate_insights(total_spent, category_breakdown, self.large_count, self.small_count)
+
+        return AnalysisResponse(
+            total_spent=round(total_spent, 2),
+            transaction_count=self.transaction_count,
+            category_breakdown=category_breakdown,
+            monthly_trend=monthly_trend,
+            insights=insights,
+            metadata=AnalysisMetadata(categorization=self.stats)
+        )
+
+def analyze_spending_patterns(transactions: List[Transaction], categorization: CategorizationMode = 'merchant') -> AnalysisResponse:
     # Convert to DataFrame for easier analysis
     df = pd.DataFrame([t.dict() for t in transactions])
-    
-    # Add categories if not present
-    if 'category' not in df.columns or df['category'].isna().any():
-        df['category'] = df['description'].apply(categorize_transaction)
-    
-    # Calculate total spending
-    total_spent = df['amount'].sum()
-    
-    # Category breakdown
-    category_stats = df.groupby('category').agg({
-        'amount': ['sum', 'count']
-    }).round(2)
-    
-    category_breakdown = []
-    for category, ((total_amount, transaction_count),) in category_stats.iterrows():
-        percentage = round((total_amount / total_spent) * 100, 2) if total_spent > 0 else 0
-        category_breakdown.append(CategorySummary(
-            category=category,
-            total_amount=round(total_amount, 2),
-            transaction_count=int(transaction_count),
-            percentage=percentage
-        ))
-    
-    # Monthly trend (simplified - using last 3 characters as month identifier)
-    monthly_trend = {}
-    try:
-        df['month'] = df['date'].str[-7:]  # Extract MM-YYYY part
-        monthly_data = df.groupby('month')['amount'].sum().round(2)
-        monthly_trend = monthly_data.to_dict()
-    except:
-        # Fallback if date parsing fails
-        monthly_trend = {"Recent": total_spent}
-    
-    # Generate insights
-    insights = generate_insights(df, total_spent, category_breakdown)
-    
-    return AnalysisResponse(
-        total_spent=round(total_spent, 2),
-        transaction_count=len(transactions),
-        category_breakdown=category_breakdown,
-        monthly_trend=monthly_trend,
-        insights=insights
-    )
 
-def generate_insights(df: pd.DataFrame, total_spent: float, categories: List[CategorySummary]) -> List[str]:
+    totals = SpendingTotals(categorization)
+    totals.add(df)
+    return totals.response()
+
+def generate_insights(total_spent: float, categories: List[CategorySummary], large_count: int, small_count: int) -> List[str]:
     insights = []
     
     if total_spent == 0:
@@ -118,9 +239,8 @@ def generate_insights(df: pd.DataFrame, total_spent: float, categories: List[Cat
         insights.append("💡 Consider reducing dining out expenses - they account for over 30% of your spending")
     
     # Check for large transactions
-    large_txns = df[df['amount'] > 500]
-    if len(large_txns) > 0:
-        insights.append(f"You have {len(large_txns)} large transactions (>$500) this period")
+    if large_count > 0:
+        insights.append(f"You have {large_count} large transactions (>$500) this period")
     
     # Savings insight
     if total_spent > 2000:
@@ -129,8 +249,7 @@ def generate_insights(df: pd.DataFrame, total_spent: float, categories: List[Cat
         insights.append("👍 Great job keeping your expenses low this month!")
     
     # Multiple small transactions insight
-    small_txns = df[df['amount'] < 10]
-    if len(small_txns) > 15:
+    if small_count > 15:
         insights.append("⚠️ You have many small transactions - they can add up quickly!")
     
     return insights
@@ -141,25 +260,95 @@ async def root():
         "message": "Spending Habit Analyzer API",
         "endpoints": {
             "analyze": "POST /analyze - Analyze transaction data",
+            "analyze_stream": "POST /analyze/stream - Analyze an NDJSON or CSV upload in chunks",
+            "analyze_columnar": "POST /analyze/columnar - Analyze column arrays (JSON, Arrow or Parquet)",
             "categories": "GET /categories - List spending categories",
             "health": "GET /health - API health check"
         }
     }
 
 @app.post("/analyze", response_model=AnalysisResponse)
-async def analyze_spending(request: AnalysisRequest):
+async def analyze_spending(request: AnalysisRequest, categorization: CategorizationMode = 'merchant'):
     """
     Analyze transaction data and provide spending insights
+
+    categorization selects how uncategorized transactions are classified:
+    'merchant' (substring keywords, cached per merchant) or 'vectorized'
+    (whole-word keyword patterns applied to the whole frame)
     """
     try:
         if not request.transactions:
             raise HTTPException(status_code=400, detail="No transactions provided")
         
-        return analyze_spending_patterns(request.transactions)
+        return analyze_spending_patterns(request.transactions, categorization)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis error: {str(e)}")
 
+@app.post("/analyze/stream", response_model=AnalysisResponse)
+async def analyze_spending_stream(
+    request: Request,
+    categorization: CategorizationMode = 'merchant',
+    chunk_rows: int = Query(STREAM_CHUNK_ROWS, ge=1, le=STREAM_MAX_CHUNK_ROWS)
+):
+    """
+    Analyze transactions sent as an NDJSON (application/x-ndjson) or CSV
+    (text/csv) body, folding chunk_rows rows at a time into running totals so
+    memory stays bounded however large the upload is
+    """
+    fmt = stream_format(request.headers.get('content-type', ''))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Send transactions as application/x-ndjson or text/csv")
+
+    totals = SpendingTotals(categorization)
+    try:
+        async for chunk in iter_transaction_frames(request.stream(), fmt, chunk_rows):
+            await run_in_threadpool(totals.add, chunk)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid transactions: {str(e)}")
+
+    if not totals.transaction_count:
+        raise HTTPException(status_code=400, detail="No transactions provided")
+    return totals.response()
+
+@app.post("/analyze/columnar", response_model=AnalysisResponse)
+async def analyze_spending_columnar(request: Request, categorization: CategorizationMode = 'merchant'):
+    """
+    Analyze transactions sent column-wise: a JSON object of id, description,
+    amount, date (and optional category) arrays, an Arrow IPC or Parquet body,
+    or any of these uploaded as the multipart form field "file"
+    """
+    fmt = columnar_format(request.headers.get('content-type', ''))
+    if fmt is None:
+        raise HTTPException(
+            status_code=415,
+            detail="Send transactions as application/json, Arrow IPC, Parquet or a multipart file upload"
+        )
+    if fmt == 'upload':
+        try:
+            upload = (await request.form()).get('file')
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Malformed upload: {str(e)}")
+        if not hasattr(upload, 'read'):
+            raise HTTPException(status_code=422, detail="Upload the transactions as the form field 'file'")
+        data = await upload.read()
+        fmt = sniff_columnar_format(data)
+    else:
+        data = await request.body()
+    if fmt != 'json' and not ARROW_AVAILABLE:
+        raise HTTPException(status_code=415, detail="Arrow and Parquet uploads need pyarrow installed")
+
+    try:
+        df = await run_in_threadpool(parse_columnar, data, fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid transactions: {str(e)}")
+    if df.empty:
+        raise HTTPException(status_code=400, detail="No transactions provided")
+
+    totals = SpendingTotals(categorization)
+    await run_in_threadpool(totals.add, df)
+    return totals.response()
+
 @app.get("/categories")
 async def get_categories():
     """
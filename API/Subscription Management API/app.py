@@ -1,24 +1,96 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
-from models import db
+from models import db, init_db, ExchangeRate
 from routes.subscriptions import subscriptions_bp
-from config import DevelopmentConfig
+from routes.admin import admin_bp
+from utils.cache import analytics_cache
+from utils.fx import exchange_rates, load_exchange_rates
+from utils.metrics import request_metrics
+from utils.migrations import upgrade_schema
+from utils.ratelimit import rate_limiter
+from utils.replica import replica
+from utils.rollups import rebuild_spend_summaries
+from utils.renewals import renew_due_subscriptions
+from utils.partitions import archive_transactions, month_start
+from config import config_by_name
+from datetime import date, timedelta
+import click
 import os
 
-def create_app():
+def create_app(config_name=None):
     app = Flask(__name__)
-    app.config.from_object(DevelopmentConfig)
+    config_name = config_name or os.environ.get('APP_CONFIG', 'development')
+    app.config.from_object(config_by_name[config_name])
     
     # Initialize extensions
-    db.init_app(app)
+    replica.init_app(app)
+    init_db(app)
+    analytics_cache.init_app(app)
+    exchange_rates.init_app(app)
+    request_metrics.init_app(app)
+    rate_limiter.init_app(app)
     CORS(app)
     
     # Register blueprints
     app.register_blueprint(subscriptions_bp, url_prefix='/api')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
     
     # Create tables
     with app.app_context():
         db.create_all()
+        # Bring databases created by earlier versions up to the current schema
+        upgrade_schema(db.engine)
+        if replica.enabled:
+            # Lets a local SQLite file stand in for the replica; a real replica already has the schema
+            db.metadata.create_all(db.engines['replica'])
+        # Seed exchange rates on a fresh database so normalized totals work out of the box
+        if ExchangeRate.query.first() is None and os.path.exists(app.config['FX_RATES_FILE']):
+            load_exchange_rates(app.config['FX_RATES_FILE'])
+    
+    @app.cli.command('rebuild-rollups')
+    @click.option('--dry-run', is_flag=True, help='Only report drift, do not rewrite the rollups')
+    def rebuild_rollups(dry_run):
+        """Rebuild UserSpendSummary from subscriptions and report any drift"""
+        drift = rebuild_spend_summaries(dry_run=dry_run)
+        for row in drift:
+            click.echo(f"{row['user_id']} / {row['category']} / {row['currency']}: stored {row['stored']} expected {row['expected']}")
+        click.echo(f"{len(drift)} drifted rollup row(s){'' if dry_run else ' rebuilt'}")
+        if not dry_run:
+            analytics_cache.clear()
+    
+    @app.cli.command('load-exchange-rates')
+    @click.argument('path', required=False)
+    def load_rates(path):
+        """Load a date,currency,rate CSV into the ExchangeRate table"""
+        count = load_exchange_rates(path or app.config['FX_RATES_FILE'])
+        click.echo(f'Loaded {count} exchange rate(s)')
+    
+    @app.cli.command('renew-subscriptions')
+    @click.option('--cutoff', type=click.DateTime(formats=['%Y-%m-%d']), help='Renew everything due on or before this date (default: today)')
+    @click.option('--chunk-size', type=int, default=None, help='Subscriptions per transaction')
+    def renew_subscriptions(cutoff, chunk_size):
+        """Record Transactions for due subscriptions and advance their billing dates"""
+        summary = renew_due_subscriptions(
+            cutoff.date() if cutoff else date.today(),
+            chunk_size=chunk_size or app.config['RENEWAL_CHUNK_SIZE']
+        )
+        click.echo(
+            f"Renewed {summary['subscriptions']} subscriptions with {summary['transactions']} transactions "
+            f"in {summary['chunks']} chunk(s), {summary['failed_chunks']} chunk(s) skipped"
+        )
+    
+    @app.cli.command('archive-transactions')
+    @click.option('--before', type=click.DateTime(formats=['%Y-%m']), help='Archive months before this one (default: keep TRANSACTION_RAW_MONTHS closed months)')
+    def archive(before):
+        """Compact closed monthly transaction partitions into per-subscription monthly totals"""
+        if before:
+            before = before.date()
+        else:
+            before = month_start(date.today())
+            for _ in range(app.config['TRANSACTION_RAW_MONTHS']):
+                before = month_start(before - timedelta(days=1))
+        summary = archive_transactions(before)
+        click.echo(f"Archived {summary['transactions']} transactions from {summary['partitions']} partition(s) before {before:%Y-%m}")
     
     # Health check route
     @app.route('/')
@@ -29,8 +101,10 @@ def create_app():
             'endpoints': {
                 'get_subscriptions': 'GET /api/subscriptions?user_id=user_id',
                 'create_subscription': 'POST /api/subscriptions',
-                'monthly_analytics': 'GET /api/analytics/monthly-spending?user_id=user_id',
-                'upcoming_renewals': 'GET /api/subscriptions/upcoming-renewals?user_id=user_id'
+                'monthly_analytics': 'GET /api/analytics/monthly-spending?user_id=user_id&base=USD',
+                'upcoming_renewals': 'GET /api/subscriptions/upcoming-renewals?user_id=user_id&days=7',
+                'renewal_forecast': 'GET /api/admin/renewals?days=30',
+                'cache_stats': 'GET /api/cache/stats'
             }
         })
     
@@ -38,4 +112,4 @@ def create_app():
 
 if __name__ == '__main__':
     app = create_app()
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(debug=app.config['DEBUG'], host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,291 @@
+"""Latency and throughput benchmark for the Subscription Management API.
+
+Seeds a throwaway SQLite database with users x subscriptions x transactions,
+then drives every route on subscriptions_bp with concurrent clients and
+reports p50/p95/p99 latency, throughput and SQL statements per request.
+
+    python benchmarks/bench_api.py --users 50 --subscriptions 200 --transactions 12
+    python benchmarks/bench_api.py --url http://localhost:5000   # against a running gunicorn
+    python benchmarks/bench_api.py --compare baseline.json       # flag regressions
+
+In --url mode the server must use the same database (pass --database and start
+gunicorn with that DATABASE_URL), and SQL statement counts are not available.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+
+CATEGORIES = ['Entertainment', 'Productivity', 'Music', 'News', 'Cloud', 'Fitness']
+CURRENCIES = ['USD', 'USD', 'USD', 'EUR', 'INR']
+FREQUENCIES = ['monthly', 'monthly', 'yearly', 'weekly']
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def seed(app, users, subscriptions, transactions, rng):
+    """Fill the database with users x subscriptions, each with `transactions` past charges"""
+    from models import db, Subscription
+    from utils.partitions import insert_transactions
+    from utils.rollups import rebuild_spend_summaries
+
+    today = date.today()
+    with app.app_context():
+        for u in range(users):
+            user_id = f'bench_user_{u}'
+            rows = [{
+                'name': f'Service {u}-{s}',
+                'amount': round(rng.uniform(1, 60), 2),
+                'currency': rng.choice(CURRENCIES),
+                'frequency': rng.choice(FREQUENCIES),
+                'next_billing_date': today + timedelta(days=rng.randint(0, 40)),
+                'category': rng.choice(CATEGORIES),
+                'status': 'active' if rng.random() > 0.1 else 'cancelled',
+                'user_id': user_id,
+                'created_at': datetime.utcnow()
+            } for s in range(subscriptions)]
+            db.session.execute(db.insert(Subscription), rows)
+
+            if transactions:
+                ids = db.session.query(Subscription.id, Subscription.amount, Subscription.currency).filter(
+                    Subscription.user_id == user_id
+                ).all()
+                insert_transactions([{
+                    'subscription_id': sub_id,
+                    'user_id': user_id,
+                    'currency': currency,
+                    'amount': amount,
+                    'transaction_date': today - timedelta(days=30 * (t + 1)),
+                    'status': 'completed'
+                } for sub_id, amount, currency in ids for t in range(transactions)])
+            db.session.commit()
+        rebuild_spend_summaries()
+
+class InProcessClient:
+    """Flask test client; counts SQL statements issued while serving each request"""
+
+    def __init__(self, app):
+        from sqlalchemy import event
+        from models import db
+
+        self.app = app
+        self._local = threading.local()
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self._local.queries = getattr(self._local, 'queries', 0) + 1
+
+    def request(self, method, path, **kwargs):
+        self._local.queries = 0
+        client = self.app.test_client()
+        response = client.open(path, method=method, **kwargs)
+        return response.status_code, self._local.queries
+
+class HttpClient:
+    """Requests against a running server; SQL statement counts are unknown"""
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self._local = threading.local()
+        self._requests = requests
+
+    def request(self, method, path, query_string=None, json=None):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        response = session.request(method, self.base_url + path, params=query_string, json=json)
+        return response.status_code, None
+
+def build_scenarios(users, subscriptions, rng):
+    """One request factory per (method, rule) on subscriptions_bp"""
+    lock = threading.Lock()
+    # Deletes consume the subscriptions created by the POST scenarios, which run first
+    created_ids = itertools.count(users * subscriptions + 1)
+
+    def user():
+        return f'bench_user_{rng.randrange(users)}'
+
+    def new_subscription():
+        return {
+            'name': 'Bench Service',
+            'amount': round(rng.uniform(1, 60), 2),
+            'frequency': rng.choice(FREQUENCIES),
+            'next_billing_date': (date.today() + timedelta(days=rng.randint(1, 30))).isoformat(),
+            'category': rng.choice(CATEGORIES),
+            'currency': rng.choice(CURRENCIES),
+            'user_id': user()
+        }
+
+    def delete(client):
+        with lock:
+            subscription_id = next(created_ids)
+        return client.request('DELETE', f'/api/subscriptions/{subscription_id}')
+
+    return {
+        ('GET', '/api/subscriptions'): lambda client: client.request(
+            'GET', '/api/subscriptions', query_string={'user_id': user(), 'limit': 100}),
+        ('POST', '/api/subscriptions'): lambda client: client.request(
+            'POST', '/api/subscriptions', json=new_subscription()),
+        ('POST', '/api/subscriptions/bulk'): lambda client: client.request(
+            'POST', '/api/subscriptions/bulk', json=[new_subscription() for _ in range(100)]),
+        ('PUT', '/api/subscriptions/<int:subscription_id>'): lambda client: client.request(
+            'PUT', f'/api/subscriptions/{rng.randint(1, users * subscriptions)}', json={'amount': round(rng.uniform(1, 60), 2)}),
+        ('PATCH', '/api/subscriptions'): lambda client: client.request(
+            'PATCH', '/api/subscriptions', json={'filter': {'user_id': user(), 'category': rng.choice(CATEGORIES)},
+                                                 'set': {'amount': round(rng.uniform(1, 60), 2)}}),
+        ('DELETE', '/api/subscriptions/<int:subscription_id>'): delete,
+        ('GET', '/api/analytics/monthly-spending'): lambda client: client.request(
+            'GET', '/api/analytics/monthly-spending', query_string={'user_id': user()}),
+        ('GET', '/api/analytics/history'): lambda client: client.request(
+            'GET', '/api/analytics/history', query_string={'user_id': user(), 'bucket': 'month'}),
+        ('GET', '/api/analytics/projection'): lambda client: client.request(
+            'GET', '/api/analytics/projection', query_string={'user_id': user()}),
+        ('GET', '/api/subscriptions/upcoming-renewals'): lambda client: client.request(
+            'GET', '/api/subscriptions/upcoming-renewals', query_string={'user_id': user(), 'days': 30}),
+        ('GET', '/api/cache/stats'): lambda client: client.request('GET', '/api/cache/stats'),
+    }
+
+def blueprint_routes(app):
+    """Every (method, rule) registered by subscriptions_bp"""
+    return sorted(
+        (method, rule.rule)
+        for rule in app.url_map.iter_rules() if rule.endpoint.startswith('subscriptions.')
+        for method in rule.methods - {'HEAD', 'OPTIONS'}
+    )
+
+def run_endpoint(client, scenario, requests_per_endpoint, concurrency):
+    latencies, statuses, queries = [], [], []
+    record = threading.Lock()
+
+    def one(_):
+        started = time.perf_counter()
+        status, count = scenario(client)
+        elapsed = time.perf_counter() - started
+        with record:
+            latencies.append(elapsed * 1000)
+            statuses.append(status)
+            if count is not None:
+                queries.append(count)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests_per_endpoint)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': sum(1 for status in statuses if status >= 500),
+        'client_errors': sum(1 for status in statuses if 400 <= status < 500),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'throughput_rps': round(len(latencies) / wall, 1),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None
+    }
+
+def compare(results, baseline_path, threshold):
+    """Return (endpoint, metric, before, after) for every p95/throughput regression beyond threshold"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)['endpoints']
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if current['p95_ms'] > before['p95_ms'] * (1 + threshold):
+            regressions.append((name, 'p95_ms', before['p95_ms'], current['p95_ms']))
+        if current['throughput_rps'] < before['throughput_rps'] * (1 - threshold):
+            regressions.append((name, 'throughput_rps', before['throughput_rps'], current['throughput_rps']))
+        if (current['queries_per_request'] or 0) > (before['queries_per_request'] or 0) + 0.5 and before['queries_per_request'] is not None:
+            regressions.append((name, 'queries_per_request', before['queries_per_request'], current['queries_per_request']))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--subscriptions', type=int, default=100, help='Subscriptions per user')
+    parser.add_argument('--transactions', type=int, default=12, help='Past transactions per subscription')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--database', help='SQLite file to seed (default: a temporary file)')
+    parser.add_argument('--url', help='Benchmark a running server instead of the in-process test client')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--compare', help='Previous results JSON to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed relative regression (default: 0.2)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    database = args.database or os.path.join(tempfile.mkdtemp(prefix='subscriptions-bench-'), 'bench.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(database)
+    # Measure the routes themselves, not the limiter's 429s
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+
+    from app import create_app
+    app = create_app(os.environ.get('APP_CONFIG', 'production'))
+    rng = random.Random(args.seed)
+
+    print(f'Seeding {args.users} users x {args.subscriptions} subscriptions x {args.transactions} transactions into {database}')
+    started = time.perf_counter()
+    seed(app, args.users, args.subscriptions, args.transactions, rng)
+    print(f'Seeded in {time.perf_counter() - started:.1f}s')
+
+    client = HttpClient(args.url) if args.url else InProcessClient(app)
+    scenarios = build_scenarios(args.users, args.subscriptions, rng)
+
+    missing = [route for route in blueprint_routes(app) if route not in scenarios]
+    if missing:
+        print(f'No scenario for: {missing}', file=sys.stderr)
+
+    results = {}
+    for (method, rule), scenario in scenarios.items():
+        name = f'{method} {rule}'
+        results[name] = run_endpoint(client, scenario, args.requests, args.concurrency)
+        r = results[name]
+        print(f"{name:55} p50 {r['p50_ms']:8.2f}ms  p95 {r['p95_ms']:8.2f}ms  p99 {r['p99_ms']:8.2f}ms  "
+              f"{r['throughput_rps']:8.1f} req/s  queries {r['queries_per_request']}  errors {r['errors']}")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'mode': 'http' if args.url else 'in-process',
+            'users': args.users,
+            'subscriptions_per_user': args.subscriptions,
+            'transactions_per_subscription': args.transactions,
+            'requests_per_endpoint': args.requests,
+            'concurrency': args.concurrency
+        },
+        'endpoints': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {args.output}')
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        for name, metric, before, after in regressions:
+            print(f'REGRESSION {name} {metric}: {before} -> {after}')
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
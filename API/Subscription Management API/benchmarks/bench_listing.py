@@ -0,0 +1,104 @@
+"""Compare subscription listing serialization paths for one user with many rows.
+
+    orm        query(Subscription) -> to_dict() -> stdlib JSON (the previous listing path)
+    projection with_entities(columns) -> compiled serializer -> stdlib JSON
+    orjson     with_entities(columns) -> compiled serializer -> orjson (if installed)
+
+    python benchmarks/bench_listing.py --rows 10000 --repeat 20
+"""
+from datetime import date, datetime, timedelta
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+
+from bench_api import CATEGORIES, CURRENCIES, FREQUENCIES
+
+USER_ID = 'listing_user'
+
+def seed(app, rows, rng):
+    from models import db, Subscription
+
+    today = date.today()
+    with app.app_context():
+        db.session.execute(db.insert(Subscription), [{
+            'name': f'Service {i}',
+            'amount': round(rng.uniform(1, 60), 2),
+            'currency': rng.choice(CURRENCIES),
+            'frequency': rng.choice(FREQUENCIES),
+            'next_billing_date': today + timedelta(days=rng.randint(0, 40)),
+            'category': rng.choice(CATEGORIES),
+            'status': 'active',
+            'user_id': USER_ID,
+            'created_at': datetime.utcnow()
+        } for i in range(rows)])
+        db.session.commit()
+
+def build_paths():
+    from models import db, Subscription
+    from routes.subscriptions import LISTING_COLUMNS, serialize_subscription
+    from utils import serialization
+
+    def base_query():
+        return db.session.query(Subscription).filter(Subscription.user_id == USER_ID).order_by(Subscription.id)
+
+    def orm():
+        return json.dumps([sub.to_dict() for sub in base_query()])
+
+    def projection():
+        return json.dumps([serialize_subscription(row) for row in base_query().with_entities(*LISTING_COLUMNS)])
+
+    paths = {'orm': orm, 'projection': projection}
+    if serialization.orjson is not None:
+        def with_orjson():
+            return serialization.orjson.dumps([serialize_subscription(row) for row in base_query().with_entities(*LISTING_COLUMNS)])
+        paths['orjson'] = with_orjson
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000, help='Subscriptions for the benchmark user')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    database = os.path.join(tempfile.mkdtemp(prefix='subscriptions-listing-'), 'bench.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + database
+
+    from app import create_app
+    from models import db
+    app = create_app(os.environ.get('APP_CONFIG', 'production'))
+    seed(app, args.rows, random.Random(args.seed))
+
+    with app.app_context():
+        paths = build_paths()
+        payloads = {name: json.loads(path()) for name, path in paths.items()}
+        reference = payloads['orm']
+        for name, payload in payloads.items():
+            if payload != reference:
+                print(f'{name} produces a different payload than orm', file=sys.stderr)
+                sys.exit(1)
+
+        baseline = None
+        for name, path in paths.items():
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                path()
+                timings.append((time.perf_counter() - started) * 1000)
+                # Drop identity-map state so every run hydrates from scratch
+                db.session.expunge_all()
+            median = statistics.median(timings)
+            baseline = baseline or median
+            print(f'{name:12} {args.rows} rows  median {median:8.2f}ms  min {min(timings):8.2f}ms  '
+                  f'{args.rows / median * 1000:10.0f} rows/s  {baseline / median:5.2f}x')
+
+if __name__ == '__main__':
+    main()
@@ -4,11 +4,64 @@ from datetime import timedelta
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key-here'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///subscriptions.db'
+    SQLALCHEMY_REPLICA_URI = os.environ.get('DATABASE_REPLICA_URL')  # optional read replica
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_pre_ping': True,
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    }
+    # Ignored for in-memory SQLite, which always uses a single shared connection
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    # Applied to every new SQLite connection
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',       # readers no longer block behind the writer
+        'synchronous': 'NORMAL',     # safe with WAL, avoids an fsync per commit
+        'cache_size': -64000,        # 64 MB page cache
+        'mmap_size': 268435456,      # 256 MB memory-mapped reads
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,        # wait for the write lock instead of failing
+        'foreign_keys': 'ON'         # enforce ON DELETE CASCADE
+    }
+    SUBSCRIPTIONS_PAGE_SIZE = 100
+    SUBSCRIPTIONS_MAX_PAGE_SIZE = 1000
+    TRANSACTIONS_INCLUDE_LIMIT = 10       # default ?tx_limit= for ?include=transactions
+    TRANSACTIONS_INCLUDE_MAX_LIMIT = 100
+    BULK_IMPORT_BATCH_SIZE = 1000
+    BULK_IMPORT_MAX_ERRORS = 1000
+    ANALYTICS_CACHE_URL = os.environ.get('ANALYTICS_CACHE_URL')  # e.g. redis://localhost:6379/0
+    ANALYTICS_CACHE_SIZE = 1024
+    ANALYTICS_CACHE_TTL = 300
+    RENEWAL_CHUNK_SIZE = 1000
+    RENEWAL_WINDOW_MAX_DAYS = 366
+    # Closed months of raw transactions kept before archive-transactions compacts them
+    TRANSACTION_RAW_MONTHS = int(os.environ.get('TRANSACTION_RAW_MONTHS', 3))
+    HISTORY_MAX_BUCKETS = 1000
+    PROJECTION_MAX_MONTHS = 60
+    DEFAULT_BASE_CURRENCY = 'USD'
+    FX_REFERENCE_CURRENCY = 'USD'  # currency the rates in the FX file are quoted against
+    FX_RATES_FILE = os.environ.get('FX_RATES_FILE') or os.path.join(os.path.dirname(__file__), 'data', 'exchange_rates.csv')
+    FX_CACHE_TTL = 3600
+    # Token buckets per user and write route; shared across workers when a Redis URL is set
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    RATE_LIMIT_RATE = float(os.environ.get('RATE_LIMIT_RATE', 5))      # tokens per second
+    RATE_LIMIT_BURST = int(os.environ.get('RATE_LIMIT_BURST', 20))
+    RATE_LIMIT_STORAGE_URL = os.environ.get('RATE_LIMIT_STORAGE_URL')  # e.g. redis://localhost:6379/1
+    RATE_LIMIT_MAX_KEYS = 100000
+    # Opt-in request profiling and a Prometheus /metrics endpoint
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+    METRICS_SLOW_REQUEST_MS = int(os.environ.get('METRICS_SLOW_REQUEST_MS', 500))
     DEBUG = True
 
 class DevelopmentConfig(Config):
     DEBUG = True
 
 class ProductionConfig(Config):
-    DEBUG = False
\ No newline at end of file
+    DEBUG = False
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+
+config_by_name = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig
+}
\ No newline at end of file
@@ -0,0 +1,41 @@
+import multiprocessing
+import os
+
+# gunicorn -c gunicorn.conf.py wsgi:app
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Threaded workers: requests mostly wait on the database, and with SQLite in
+# WAL mode reads run concurrently across threads and processes
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = 5
+# Recycle workers periodically to bound memory growth
+max_requests = 1000
+max_requests_jitter = 100
+
+# Each worker must open its own database connections, so do not preload the app
+preload_app = False
+
+raw_env = ['APP_CONFIG=' + os.environ.get('APP_CONFIG', 'production')]
+
+accesslog = '-'
+errorlog = '-'
+
+def on_starting(server):
+    # Cached analytics are checked against the user's data version, so per-worker
+    # caches never serve stale totals, but each worker has to fill its own
+    if workers > 1 and not os.environ.get('ANALYTICS_CACHE_URL'):
+        server.log.warning(
+            'ANALYTICS_CACHE_URL is not set: each of the %d workers keeps its own analytics cache', workers
+        )
+
+    # Create, upgrade and seed the database once in the master, so workers booting
+    # together do not race on it; its connections are closed before forking
+    from app import create_app
+    from models import db
+    with create_app().app_context():
+        for engine in db.engines.values():
+            engine.dispose()
@@ -1,15 +1,106 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import case, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.hybrid import hybrid_property
 from datetime import datetime, timedelta
 
 db = SQLAlchemy()
 
+def init_db(app):
+    """Bind db to the app with pool settings and, on SQLite, the configured pragmas"""
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    in_memory = uri.startswith('sqlite') and (':memory:' in uri or uri.rstrip('/') == 'sqlite:')
+    if not in_memory:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_size': app.config['DB_POOL_SIZE'],
+            'max_overflow': app.config['DB_MAX_OVERFLOW'],
+            **app.config['SQLALCHEMY_ENGINE_OPTIONS']
+        }
+    
+    db.init_app(app)
+    
+    if uri.startswith('sqlite'):
+        pragmas = app.config.get('SQLITE_PRAGMAS', {})
+        
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+            cursor.close()
+        
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'connect', set_sqlite_pragmas)
+
+def upsert_increment(model, keys, rows, increments):
+    """Insert rows, or add their `increments` columns onto the existing row with the same keys.
+
+    Other non-key columns are overwritten. Runs in the current transaction.
+    """
+    if not rows:
+        return
+    table = model.__table__
+    
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={
+                column: table.c[column] + stmt.excluded[column] if column in increments else stmt.excluded[column]
+                for column in rows[0] if column not in keys
+            }
+        )
+        db.session.execute(stmt, rows)
+        return
+    
+    # Portable fallback: update in place, insert the rows that did not exist yet
+    for row in rows:
+        result = db.session.execute(
+            table.update().where(*(table.c[key] == row[key] for key in keys)).values({
+                column: table.c[column] + value if column in increments else value
+                for column, value in row.items() if column not in keys
+            })
+        )
+        if result.rowcount == 0:
+            db.session.execute(table.insert().values(**row))
+
+def monthly_cost_expression(amount, frequency):
+    """SQL normalization of an amount to a monthly cost"""
+    return case(
+        (frequency == 'yearly', amount / 12),
+        (frequency == 'weekly', amount * 4),
+        else_=amount
+    )
+
+def yearly_cost_expression(amount, frequency):
+    """SQL normalization of an amount to a yearly cost"""
+    return case(
+        (frequency == 'monthly', amount * 12),
+        (frequency == 'weekly', amount * 52),
+        else_=amount
+    )
+
 class Subscription(db.Model):
+    __table_args__ = (
+        # Serve per-user analytics grouped by category and renewal lookups
+        db.Index('ix_subscription_user_status_category', 'user_id', 'status', 'category'),
+        db.Index('ix_subscription_user_status_billing', 'user_id', 'status', 'next_billing_date'),
+        # Keyset pagination of a user's subscriptions
+        db.Index('ix_subscription_user_id', 'user_id', 'id'),
+        # Cross-user scans for subscriptions due on or before a date
+        db.Index('ix_subscription_status_billing', 'status', 'next_billing_date'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     amount = db.Column(db.Float, nullable=False)
     currency = db.Column(db.String(3), default='USD')
     frequency = db.Column(db.String(20), nullable=False)  # monthly, yearly, weekly
     next_billing_date = db.Column(db.Date, nullable=False)
+    # Day of the month charged on, set with next_billing_date; short months clamp only their own charge
+    billing_day = db.Column(db.SmallInteger)
     category = db.Column(db.String(50))  # entertainment, productivity, etc.
     status = db.Column(db.String(20), default='active')
     user_id = db.Column(db.String(100), nullable=False)
@@ -29,7 +120,22 @@ class Subscription(db.Model):
             'created_at': self.created_at.isoformat()
         }
     
-    def calculate_yearly_cost(self):
+    @hybrid_property
+    def monthly_cost(self):
+        if self.frequency == 'yearly':
+            return self.amount / 12
+        elif self.frequency == 'weekly':
+            return self.amount * 4
+        else:
+            return self.amount
+    
+    @monthly_cost.expression
+    def monthly_cost(cls):
+        # Same normalization as above, evaluated by the database
+        return monthly_cost_expression(cls.amount, cls.frequency)
+    
+    @hybrid_property
+    def yearly_cost(self):
         if self.frequency == 'monthly':
             return self.amount * 12
         elif self.frequency == 'yearly':
@@ -38,12 +144,81 @@ class Subscription(db.Model):
             return self.amount * 52
         else:
             return self.amount
+    
+    @yearly_cost.expression
+    def yearly_cost(cls):
+        return yearly_cost_expression(cls.amount, cls.frequency)
+    
+    def calculate_yearly_cost(self):
+        return self.yearly_cost
+
+class UserSpendSummary(db.Model):
+    """Running monthly/yearly totals of a user's active subscriptions per category and currency"""
+    user_id = db.Column(db.String(100), primary_key=True)
+    category = db.Column(db.String(50), primary_key=True)
+    currency = db.Column(db.String(3), primary_key=True)
+    subscription_count = db.Column(db.Integer, nullable=False, default=0)
+    monthly_total = db.Column(db.Float, nullable=False, default=0)
+    yearly_total = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class UserDataVersion(db.Model):
+    """Counter bumped on every write to a user's subscriptions; drives ETags"""
+    user_id = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class DatasetVersion(db.Model):
+    """Counter bumped whenever a dataset shared by all users changes (e.g. exchange rates); part of every ETag"""
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class IdSequence(db.Model):
+    """Last id handed out for a set of tables that share one id space (the transaction partitions)"""
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+class ExchangeRate(db.Model):
+    """Units of currency per one unit of the reference currency on a date"""
+    currency = db.Column(db.String(3), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    rate = db.Column(db.Float, nullable=False)
 
 class Transaction(db.Model):
+    """Schema of a charge; rows live in monthly partition tables (see utils.partitions).
+
+    This table itself only holds charges recorded before partitioning and is
+    drained by the archival job.
+    """
+    __table_args__ = (
+        # One charge per subscription per billing date keeps renewals idempotent;
+        # the constraint's index also serves per-subscription date ranges
+        db.UniqueConstraint('subscription_id', 'transaction_date', name='uq_transaction_subscription_date'),
+        # Per-user history without joining through Subscription
+        db.Index('ix_transaction_user_date', 'user_id', 'transaction_date'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
-    subscription_id = db.Column(db.Integer, db.ForeignKey('subscription.id'), nullable=False)
+    # The database deletes a subscription's transactions with it
+    subscription_id = db.Column(db.Integer, db.ForeignKey('subscription.id', ondelete='CASCADE'), nullable=False)
+    # Denormalized from the subscription at charge time
+    user_id = db.Column(db.String(100), nullable=False)
+    currency = db.Column(db.String(3), nullable=False, default='USD')
     amount = db.Column(db.Float, nullable=False)
     transaction_date = db.Column(db.Date, nullable=False)
     status = db.Column(db.String(20), default='completed')
+
+class TransactionMonthSummary(db.Model):
+    """Per-subscription monthly totals of archived (compacted) transaction partitions"""
+    __table_args__ = (
+        db.Index('ix_transaction_month_summary_user_month', 'user_id', 'month'),
+    )
     
-    subscription = db.relationship('Subscription', backref=db.backref('transactions', lazy=True))
\ No newline at end of file
+    subscription_id = db.Column(db.Integer, db.ForeignKey('subscription.id', ondelete='CASCADE'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)  # first day of the month
+    status = db.Column(db.String(20), primary_key=True)
+    currency = db.Column(db.String(3), primary_key=True)
+    user_id = db.Column(db.String(100), nullable=False)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    amount_total = db.Column(db.Float, nullable=False, default=0)
@@ -0,0 +1,87 @@
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from models import db, Subscription
+from utils.fx import exchange_rates, normalize_amounts, unconverted_currencies
+from utils.helpers import renewal_window
+from utils.replica import replica
+import json
+
+admin_bp = Blueprint('admin', __name__)
+
+@admin_bp.route('/renewals', methods=['GET'])
+@replica.read_only
+def renewal_forecast():
+    """Get renewals across all users in the next N days, grouped by day and currency"""
+    try:
+        today, window_end = renewal_window(
+            request.args.get('days', 7, type=int),
+            current_app.config['RENEWAL_WINDOW_MAX_DAYS']
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Served by the (status, next_billing_date) index
+    in_window = (
+        Subscription.status == 'active',
+        Subscription.next_billing_date >= today,
+        Subscription.next_billing_date <= window_end
+    )
+
+    if request.args.get('detail') == 'ndjson':
+        rows = replica.session.query(
+            Subscription.id,
+            Subscription.user_id,
+            Subscription.name,
+            Subscription.amount,
+            Subscription.currency,
+            Subscription.next_billing_date
+        ).filter(*in_window).order_by(Subscription.next_billing_date, Subscription.id).yield_per(1000)
+
+        def generate():
+            for sub_id, user_id, name, amount, currency, billing_date in rows:
+                yield json.dumps({
+                    'id': sub_id,
+                    'user_id': user_id,
+                    'name': name,
+                    'amount': amount,
+                    'currency': currency,
+                    'next_billing_date': billing_date.isoformat()
+                }) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    currency = db.func.coalesce(Subscription.currency, 'USD')
+    grouped = replica.session.query(
+        Subscription.next_billing_date,
+        currency,
+        db.func.count(Subscription.id),
+        db.func.sum(Subscription.amount)
+    ).filter(*in_window).group_by(
+        Subscription.next_billing_date, currency
+    ).order_by(Subscription.next_billing_date, currency).all()
+
+    base = request.args.get('base', current_app.config['DEFAULT_BASE_CURRENCY']).upper()
+
+    by_day = []
+    totals_by_currency = {}
+    for billing_date, code, count, total in grouped:
+        by_day.append({
+            'date': billing_date.isoformat(),
+            'currency': code,
+            'subscriptions': count,
+            'total_amount': round(total, 2)
+        })
+        totals_by_currency[code] = round(totals_by_currency.get(code, 0) + total, 2)
+
+    try:
+        factors = exchange_rates.conversion_factors(totals_by_currency.keys(), base)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'renewals_by_day': by_day,
+        'totals_by_currency': totals_by_currency,
+        'base_currency': base,
+        'total_amount': normalize_amounts(totals_by_currency, factors),
+        'unconverted_currencies': unconverted_currencies(totals_by_currency, factors),
+        'period': f'{today} to {window_end}'
+    })
\ No newline at end of file
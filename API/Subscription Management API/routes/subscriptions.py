@@ -1,46 +1,178 @@
-from flask import Blueprint, request, jsonify
-from models import db, Subscription, Transaction
-from utils.helpers import calculate_upcoming_costs, get_subscriptions_by_category
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from models import db, Subscription, Transaction, TransactionMonthSummary
+from utils.cache import analytics_cache
+from utils.ratelimit import rate_limiter
+from utils.replica import replica
+from utils.versioning import bump_data_versions, conditional_get
+from utils.fx import exchange_rates, normalize_amounts, unconverted_currencies
+from utils.helpers import (
+    BUCKETS, FREQUENCIES, UPDATABLE_FIELDS, date_bucket, normalize_currency, parse_amount, parse_subscription_changes, parse_subscription_row, renewal_window, summarize_spending
+)
+from utils.partitions import month_start, next_month, select_transactions
+from utils.projection import monthly_cashflow
+from utils.rollups import apply_spend_deltas, matching_contributions, spend_contribution
+from utils.serialization import compile_row_serializer, dumps, json_response
+from sqlalchemy import insert, update
+from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime, timedelta
+from itertools import islice
+import csv
+import io
 import json
 
 subscriptions_bp = Blueprint('subscriptions', __name__)
 
+# Listings read plain column tuples and serialize them without hydrating ORM objects;
+# the columns are the fields of Subscription.to_dict(), in the same order
+LISTING_COLUMNS = (
+    Subscription.id, Subscription.name, Subscription.amount, Subscription.currency,
+    Subscription.frequency, Subscription.next_billing_date, Subscription.category,
+    Subscription.status, Subscription.user_id, Subscription.created_at
+)
+serialize_subscription = compile_row_serializer(LISTING_COLUMNS)
+TRANSACTION_COLUMNS = (
+    Transaction.id, Transaction.subscription_id, Transaction.amount,
+    Transaction.currency, Transaction.transaction_date, Transaction.status
+)
+serialize_transaction = compile_row_serializer(TRANSACTION_COLUMNS)
+
+def _base_currency():
+    """Currency requested for normalized totals (?base=)"""
+    return request.args.get('base', current_app.config['DEFAULT_BASE_CURRENCY']).upper()
+
+def _parse_page_args():
+    """Read the keyset pagination arguments (limit, after) from the query string"""
+    limit = request.args.get('limit', current_app.config['SUBSCRIPTIONS_PAGE_SIZE'], type=int)
+    after = request.args.get('after', 0, type=int)
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return min(limit, current_app.config['SUBSCRIPTIONS_MAX_PAGE_SIZE']), after
+
+def _parse_include_args():
+    """Return the per-subscription transaction limit for ?include=transactions, or None"""
+    if request.args.get('include') != 'transactions':
+        return None
+    tx_limit = request.args.get('tx_limit', current_app.config['TRANSACTIONS_INCLUDE_LIMIT'], type=int)
+    if tx_limit is None or not 0 < tx_limit <= current_app.config['TRANSACTIONS_INCLUDE_MAX_LIMIT']:
+        raise ValueError(f"tx_limit must be between 1 and {current_app.config['TRANSACTIONS_INCLUDE_MAX_LIMIT']}")
+    return tx_limit
+
+def _attach_transactions(subscriptions, tx_limit):
+    """Add each subscription's latest tx_limit transactions with one windowed query"""
+    if not subscriptions:
+        return subscriptions
+    by_id = {sub['id']: sub for sub in subscriptions}
+    for sub in subscriptions:
+        sub['transactions'] = []
+    
+    # ROW_NUMBER per subscription keeps the top N of every subscription in a single
+    # statement, however many subscriptions the page holds
+    session = replica.session
+    transactions = select_transactions(
+        session,
+        [column.key for column in TRANSACTION_COLUMNS],
+        where=lambda c: (c.subscription_id.in_(by_id),)
+    )
+    ranked = db.select(
+        *transactions.c,
+        db.func.row_number().over(
+            partition_by=transactions.c.subscription_id,
+            order_by=(transactions.c.transaction_date.desc(), transactions.c.id.desc())
+        ).label('position')
+    ).subquery()
+    rows = session.execute(
+        db.select(*(ranked.c[column.key] for column in TRANSACTION_COLUMNS))
+        .where(ranked.c.position <= tx_limit)
+        .order_by(ranked.c.subscription_id, ranked.c.position)
+    )
+    for row in rows:
+        by_id[row.subscription_id]['transactions'].append(serialize_transaction(row))
+    return subscriptions
+
 @subscriptions_bp.route('/subscriptions', methods=['GET'])
+@replica.read_only
+@conditional_get
 def get_subscriptions():
-    """Get all subscriptions for a user"""
+    """Get a page of subscriptions for a user"""
     user_id = request.args.get('user_id', 'default_user')
     
-    subscriptions = Subscription.query.filter_by(user_id=user_id).all()
+    try:
+        limit, after = _parse_page_args()
+        tx_limit = _parse_include_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Calculate totals
-    totals = calculate_upcoming_costs(subscriptions)
-    categories = get_subscriptions_by_category(subscriptions)
+    # Keyset pagination on the primary key keeps every page an index range scan
+    query = replica.session.query(Subscription).filter(
+        Subscription.user_id == user_id,
+        Subscription.id > after
+    ).order_by(Subscription.id).with_entities(*LISTING_COLUMNS)
     
-    return jsonify({
-        'subscriptions': [sub.to_dict() for sub in subscriptions],
+    if request.args.get('format') == 'ndjson':
+        # Stream one subscription per line; an explicit limit is honoured, otherwise
+        # the remaining rows are fetched in page-sized batches
+        if 'limit' in request.args:
+            query = query.limit(limit)
+        rows = query.yield_per(current_app.config['SUBSCRIPTIONS_PAGE_SIZE'])
+        
+        def generate():
+            if tx_limit is None:
+                for row in rows:
+                    yield dumps(serialize_subscription(row)) + '\n'
+                return
+            # One transactions query per batch of streamed subscriptions
+            remaining = iter(rows)
+            batches = iter(lambda: list(islice(remaining, current_app.config['SUBSCRIPTIONS_PAGE_SIZE'])), [])
+            for batch in batches:
+                for sub in _attach_transactions([serialize_subscription(row) for row in batch], tx_limit):
+                    yield dumps(sub) + '\n'
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    try:
+        totals, categories = summarize_spending(user_id, _base_currency(), refresh=replica.wants_primary())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    subscriptions = [serialize_subscription(row) for row in query.limit(limit)]
+    next_cursor = subscriptions[-1]['id'] if len(subscriptions) == limit else None
+    if tx_limit is not None:
+        _attach_transactions(subscriptions, tx_limit)
+    
+    return json_response({
+        'subscriptions': subscriptions,
+        'next_cursor': next_cursor,
         'totals': totals,
         'categories': categories
     })
 
 @subscriptions_bp.route('/subscriptions', methods=['POST'])
+@rate_limiter.limit
 def create_subscription():
     """Create a new subscription"""
     data = request.get_json()
     
     try:
+        if data['frequency'] not in FREQUENCIES:
+            raise ValueError(f"frequency must be one of {', '.join(FREQUENCIES)}")
+        next_billing_date = datetime.strptime(data['next_billing_date'], '%Y-%m-%d').date()
         subscription = Subscription(
             name=data['name'],
-            amount=data['amount'],
-            currency=data.get('currency', 'USD'),
+            amount=parse_amount(data['amount']),
+            currency=normalize_currency(data.get('currency', 'USD')),
             frequency=data['frequency'],
-            next_billing_date=datetime.strptime(data['next_billing_date'], '%Y-%m-%d').date(),
+            next_billing_date=next_billing_date,
+            billing_day=next_billing_date.day,
             category=data.get('category', 'Other'),
             user_id=data.get('user_id', 'default_user')
         )
         
         db.session.add(subscription)
+        db.session.flush()
+        apply_spend_deltas(added=[spend_contribution(subscription)])
+        bump_data_versions(subscription.user_id)
         db.session.commit()
+        analytics_cache.invalidate(subscription.user_id)
         
         return jsonify({
             'message': 'Subscription created successfully',
@@ -50,23 +182,101 @@ def create_subscription():
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+def _read_bulk_records():
+    """Yield the raw records of a bulk import body (JSON array, NDJSON or CSV)"""
+    if request.mimetype == 'text/csv':
+        yield from csv.DictReader(io.TextIOWrapper(request.stream, encoding='utf-8'))
+    elif request.mimetype == 'application/x-ndjson':
+        # Lines are decoded per row so one bad line only fails that row
+        for line in io.TextIOWrapper(request.stream, encoding='utf-8'):
+            if line.strip():
+                yield line
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            raise ValueError('Expected a JSON array, NDJSON or CSV body')
+        yield from data
+
+def _insert_batch(rows, row_numbers, failed):
+    """Insert one batch with a single executemany; on error report every row in it"""
+    try:
+        db.session.execute(insert(Subscription), rows)
+        apply_spend_deltas(added=[spend_contribution(Subscription(**row)) for row in rows])
+        bump_data_versions(*(row['user_id'] for row in rows))
+        db.session.commit()
+        analytics_cache.invalidate(*(row['user_id'] for row in rows))
+        return len(rows)
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        failed.extend({'row': number, 'error': str(getattr(e, 'orig', None) or e)} for number in row_numbers)
+        return 0
+
+@subscriptions_bp.route('/subscriptions/bulk', methods=['POST'])
+@rate_limiter.limit
+def bulk_create_subscriptions():
+    """Import many subscriptions in batched transactions"""
+    batch_size = request.args.get('batch_size', current_app.config['BULK_IMPORT_BATCH_SIZE'], type=int)
+    if batch_size < 1:
+        return jsonify({'error': 'batch_size must be a positive integer'}), 400
+    
+    inserted = 0
+    failed = []
+    rows, row_numbers = [], []
+    
+    try:
+        for number, record in enumerate(_read_bulk_records(), start=1):
+            try:
+                if isinstance(record, str):
+                    record = json.loads(record)
+                rows.append(parse_subscription_row(record))
+                row_numbers.append(number)
+            except ValueError as e:
+                failed.append({'row': number, 'error': str(e)})
+            
+            if len(rows) >= batch_size:
+                inserted += _insert_batch(rows, row_numbers, failed)
+                rows, row_numbers = [], []
+    except (ValueError, csv.Error) as e:
+        # Malformed body: keep whatever was already committed and say where it stopped
+        if not inserted and not rows:
+            return jsonify({'error': str(e)}), 400
+        failed.append({'row': None, 'error': str(e)})
+    
+    if rows:
+        inserted += _insert_batch(rows, row_numbers, failed)
+    
+    max_errors = current_app.config['BULK_IMPORT_MAX_ERRORS']
+    return jsonify({
+        'message': f'Imported {inserted} subscriptions',
+        'inserted': inserted,
+        'failed_count': len(failed),
+        'failed': failed[:max_errors]
+    }), 201 if inserted else 400
+
+def _subscription_owner(subscription_id):
+    """User owning a subscription (None if it does not exist), for rate limiting"""
+    return db.session.query(Subscription.user_id).filter(Subscription.id == subscription_id).scalar()
+
 @subscriptions_bp.route('/subscriptions/<int:subscription_id>', methods=['PUT'])
+@rate_limiter.limit(user=_subscription_owner)
 def update_subscription(subscription_id):
     """Update a subscription"""
     subscription = Subscription.query.get_or_404(subscription_id)
     data = request.get_json()
     
     try:
-        subscription.name = data.get('name', subscription.name)
-        subscription.amount = data.get('amount', subscription.amount)
-        subscription.frequency = data.get('frequency', subscription.frequency)
-        subscription.category = data.get('category', subscription.category)
-        subscription.status = data.get('status', subscription.status)
+        # Validated like a bulk update; other fields (e.g. id, user_id) are ignored
+        changes = {field: value for field, value in data.items() if field in UPDATABLE_FIELDS}
+        values = parse_subscription_changes(changes) if changes else {}
         
-        if 'next_billing_date' in data:
-            subscription.next_billing_date = datetime.strptime(data['next_billing_date'], '%Y-%m-%d').date()
+        previous = spend_contribution(subscription)
+        for field, value in values.items():
+            setattr(subscription, field, value)
         
+        apply_spend_deltas(added=[spend_contribution(subscription)], removed=[previous])
+        bump_data_versions(subscription.user_id)
         db.session.commit()
+        analytics_cache.invalidate(subscription.user_id)
         
         return jsonify({
             'message': 'Subscription updated successfully',
@@ -76,61 +286,260 @@ def update_subscription(subscription_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+def _bulk_update_criteria(data):
+    """Build the WHERE clause of a bulk update from its filter object (user_id required)"""
+    if not isinstance(data, dict) or not data.get('user_id'):
+        raise ValueError('filter.user_id is required')
+    unknown = sorted(set(data) - {'user_id', 'category', 'ids'})
+    if unknown:
+        raise ValueError(f"unknown filter field(s): {', '.join(unknown)}")
+    
+    criteria = [Subscription.user_id == data['user_id']]
+    if 'category' in data:
+        criteria.append(Subscription.category == data['category'])
+    if 'ids' in data:
+        ids = data['ids']
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            raise ValueError('filter.ids must be a list of integers')
+        criteria.append(Subscription.id.in_(ids))
+    return criteria
+
+@subscriptions_bp.route('/subscriptions', methods=['PATCH'])
+@rate_limiter.limit
+def bulk_update_subscriptions():
+    """Update every subscription matching a filter with one UPDATE statement"""
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        criteria = _bulk_update_criteria(data.get('filter'))
+        values = parse_subscription_changes(data.get('set'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    user_id = data['filter']['user_id']
+    try:
+        # Rollup deltas are aggregated by the database from the rows' before and
+        # after images, so no subscription is loaded into Python
+        removed = matching_contributions(criteria)
+        added = matching_contributions(criteria, values)
+        result = db.session.execute(
+            update(Subscription).where(*criteria).values(values),
+            execution_options={'synchronize_session': False}
+        )
+        if result.rowcount:
+            apply_spend_deltas(added=added, removed=removed)
+            bump_data_versions(user_id)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({'error': str(getattr(e, 'orig', None) or e)}), 400
+    
+    if result.rowcount:
+        analytics_cache.invalidate(user_id)
+    return jsonify({
+        'message': 'Subscriptions updated successfully',
+        'updated': result.rowcount
+    })
+
 @subscriptions_bp.route('/subscriptions/<int:subscription_id>', methods=['DELETE'])
+@rate_limiter.limit(user=_subscription_owner)
 def delete_subscription(subscription_id):
     """Delete a subscription"""
     subscription = Subscription.query.get_or_404(subscription_id)
     
+    # Partitions cascade, but the legacy table of an upgraded database keeps its
+    # original foreign key without ON DELETE CASCADE
+    legacy = Transaction.__table__
+    db.session.execute(legacy.delete().where(legacy.c.subscription_id == subscription_id))
     db.session.delete(subscription)
+    apply_spend_deltas(removed=[spend_contribution(subscription)])
+    bump_data_versions(subscription.user_id)
     db.session.commit()
+    analytics_cache.invalidate(subscription.user_id)
     
     return jsonify({'message': 'Subscription deleted successfully'})
 
 @subscriptions_bp.route('/analytics/monthly-spending', methods=['GET'])
+@replica.read_only
+@conditional_get
 def monthly_spending_analytics():
     """Get monthly spending analytics"""
     user_id = request.args.get('user_id', 'default_user')
     
-    subscriptions = Subscription.query.filter_by(user_id=user_id, status='active').all()
+    # Read from the per-category rollup maintained on every write
+    try:
+        totals, categories = summarize_spending(user_id, _base_currency(), refresh=replica.wants_primary())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Calculate spending by category
-    category_spending = {}
-    for sub in subscriptions:
-        category = sub.category or 'Uncategorized'
-        monthly_cost = sub.amount
-        if sub.frequency == 'yearly':
-            monthly_cost = sub.amount / 12
-        elif sub.frequency == 'weekly':
-            monthly_cost = sub.amount * 4
-        
-        if category not in category_spending:
-            category_spending[category] = 0
-        category_spending[category] += monthly_cost
+    return jsonify({
+        'base_currency': totals['base_currency'],
+        'monthly_spending_by_category': {name: summary['monthly_total'] for name, summary in categories.items()},
+        'monthly_spending_by_currency': {code: costs['monthly_total'] for code, costs in totals['by_currency'].items()},
+        'total_monthly_spending': totals['monthly_total'],
+        'unconverted_currencies': totals['unconverted_currencies']
+    })
+
+def _parse_date_arg(name, default):
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'{name} must be a YYYY-MM-DD date')
+
+@subscriptions_bp.route('/analytics/history', methods=['GET'])
+@replica.read_only
+@conditional_get
+def spending_history():
+    """Get historical spending from transactions, bucketed by day, week or month"""
+    user_id = request.args.get('user_id', 'default_user')
+    bucket = request.args.get('bucket', 'month')
+    base = _base_currency()
+    
+    try:
+        end = _parse_date_arg('to', datetime.now().date())
+        start = _parse_date_arg('from', end - timedelta(days=365))
+        if start > end:
+            raise ValueError('from must not be after to')
+        if bucket in BUCKETS and (end - start).days // BUCKETS[bucket] > current_app.config['HISTORY_MAX_BUCKETS']:
+            raise ValueError(f'Range too large for {bucket} buckets; use a coarser bucket')
+        session = replica.session
+        dialect = session.get_bind().dialect.name
+        # Archived months only have monthly totals
+        archived_through = session.query(db.func.max(TransactionMonthSummary.month)).filter(
+            TransactionMonthSummary.user_id == user_id
+        ).scalar()
+        if bucket != 'month' and archived_through and start < next_month(archived_through):
+            raise ValueError(f"{bucket} buckets start after {archived_through:%Y-%m}; use bucket=month for older history")
+        # Only the monthly partitions overlapping the range are read
+        transactions = select_transactions(
+            session,
+            ('currency', 'amount', 'transaction_date'),
+            where=lambda c: (c.user_id == user_id, c.status == 'completed'),
+            start=start,
+            end=end
+        )
+        period = date_bucket(transactions.c.transaction_date, bucket, dialect)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    rows = session.execute(
+        db.select(period, transactions.c.currency, db.func.count(), db.func.sum(transactions.c.amount))
+        .group_by(period, transactions.c.currency)
+    ).all()
+    if archived_through and start < next_month(archived_through):
+        # Archived months are counted whole
+        month = date_bucket(TransactionMonthSummary.month, 'month', dialect)
+        rows += session.query(
+            month,
+            TransactionMonthSummary.currency,
+            db.func.sum(TransactionMonthSummary.transaction_count),
+            db.func.sum(TransactionMonthSummary.amount_total)
+        ).filter(
+            TransactionMonthSummary.user_id == user_id,
+            TransactionMonthSummary.status == 'completed',
+            TransactionMonthSummary.month >= month_start(start),
+            TransactionMonthSummary.month <= end
+        ).group_by(month, TransactionMonthSummary.currency).all()
+    rows.sort(key=lambda row: row[0])
+    
+    try:
+        factors = exchange_rates.conversion_factors({currency for _, currency, _, _ in rows}, base)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Round the values
-    for category in category_spending:
-        category_spending[category] = round(category_spending[category], 2)
+    history = {}
+    total_by_currency = {}
+    for label, currency, count, amount in rows:
+        entry = history.setdefault(label, {'period': label, 'transactions': 0, 'by_currency': {}})
+        entry['transactions'] += count
+        entry['by_currency'][currency] = round(entry['by_currency'].get(currency, 0) + amount, 2)
+        total_by_currency[currency] = round(total_by_currency.get(currency, 0) + amount, 2)
+    for entry in history.values():
+        entry['total'] = normalize_amounts(entry['by_currency'], factors)
     
     return jsonify({
-        'monthly_spending_by_category': category_spending,
-        'total_monthly_spending': round(sum(category_spending.values()), 2)
+        'user_id': user_id,
+        'bucket': bucket,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'base_currency': base,
+        'history': list(history.values()),
+        'total_by_currency': total_by_currency,
+        'total_spent': normalize_amounts(total_by_currency, factors),
+        'unconverted_currencies': unconverted_currencies(total_by_currency, factors)
+    })
+
+@subscriptions_bp.route('/analytics/projection', methods=['GET'])
+@replica.read_only
+@conditional_get
+def cashflow_projection():
+    """Project charges for the next N months (default: 12) by month and category from actual billing dates"""
+    user_id = request.args.get('user_id', 'default_user')
+    months = request.args.get('months', 12, type=int)
+    base = _base_currency()
+    if months is None or not 0 < months <= current_app.config['PROJECTION_MAX_MONTHS']:
+        return jsonify({'error': f"months must be between 1 and {current_app.config['PROJECTION_MAX_MONTHS']}"}), 400
+    
+    subscriptions = replica.session.query(
+        Subscription.next_billing_date,
+        Subscription.billing_day,
+        Subscription.frequency,
+        Subscription.amount,
+        Subscription.currency,
+        Subscription.category
+    ).filter(
+        Subscription.user_id == user_id,
+        Subscription.status == 'active'
+    ).all()
+    
+    try:
+        factors = exchange_rates.conversion_factors({row.currency for row in subscriptions}, base)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    today = datetime.now().date()
+    projection, total_by_currency = monthly_cashflow(subscriptions, factors, today, months)
+    
+    return jsonify({
+        'user_id': user_id,
+        'base_currency': base,
+        'projection': projection,
+        'total_by_currency': total_by_currency,
+        'total_projected': normalize_amounts(total_by_currency, factors),
+        'unconverted_currencies': unconverted_currencies(total_by_currency, factors)
     })
 
 @subscriptions_bp.route('/subscriptions/upcoming-renewals', methods=['GET'])
+@replica.read_only
+@conditional_get
 def upcoming_renewals():
-    """Get subscriptions due for renewal in the next 7 days"""
+    """Get subscriptions due for renewal in the next N days (default: 7)"""
     user_id = request.args.get('user_id', 'default_user')
-    today = datetime.now().date()
-    next_week = today + timedelta(days=7)
     
-    upcoming = Subscription.query.filter(
+    try:
+        today, window_end = renewal_window(
+            request.args.get('days', 7, type=int),
+            current_app.config['RENEWAL_WINDOW_MAX_DAYS']
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    upcoming = replica.session.query(Subscription).filter(
         Subscription.user_id == user_id,
         Subscription.status == 'active',
         Subscription.next_billing_date >= today,
-        Subscription.next_billing_date <= next_week
+        Subscription.next_billing_date <= window_end
     ).all()
     
     return jsonify({
         'upcoming_renewals': [sub.to_dict() for sub in upcoming],
-        'period': f'{today} to {next_week}'
-    })
\ No newline at end of file
+        'period': f'{today} to {window_end}'
+    })
+
+@subscriptions_bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Get analytics cache hit/miss counters"""
+    return jsonify(analytics_cache.stats())
\ No newline at end of file
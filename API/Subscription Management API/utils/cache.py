@@ -0,0 +1,152 @@
+from collections import OrderedDict
+from functools import wraps
+import json
+import threading
+import time
+from utils.versioning import data_version
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+class LRUCache:
+    """In-process per-user cache with least-recently-used eviction and a TTL"""
+
+    name = 'lru'
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, key):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, values = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return values.get(key)
+
+    def set(self, user_id, key, value):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                entry = (time.monotonic() + self.ttl, {})
+                self._entries[user_id] = entry
+            entry[1][key] = value
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+class RedisCache:
+    """Per-user cache stored as one Redis hash per user"""
+
+    name = 'redis'
+
+    def __init__(self, url, ttl=300, prefix='subscriptions:analytics:'):
+        if redis is None:
+            raise RuntimeError('ANALYTICS_CACHE_URL is set but the redis package is not installed')
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, user_id, key):
+        value = self.client.hget(self.prefix + user_id, key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, user_id, key, value):
+        pipe = self.client.pipeline()
+        pipe.hset(self.prefix + user_id, key, json.dumps(value))
+        pipe.expire(self.prefix + user_id, self.ttl)
+        pipe.execute()
+
+    def delete(self, user_id):
+        self.client.delete(self.prefix + user_id)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+    def size(self):
+        return None
+
+class AnalyticsCache:
+    """Caches per-user analytics results; writes invalidate the user's entry.
+
+    Values are stored with the user's data version (from the version
+    function) and only served while it is unchanged, so a result cached before
+    a write is never returned after it, even by a process the write's
+    invalidation did not reach.
+    """
+
+    def __init__(self, backend=None, version=lambda user_id: 0):
+        self.backend = backend or LRUCache()
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        url = app.config.get('ANALYTICS_CACHE_URL')
+        ttl = app.config.get('ANALYTICS_CACHE_TTL', 300)
+        if url:
+            self.backend = RedisCache(url, ttl=ttl)
+        else:
+            self.backend = LRUCache(max_size=app.config.get('ANALYTICS_CACHE_SIZE', 1024), ttl=ttl)
+
+    def memoize(self, func):
+        """Cache func(user_id) under the user's entry, keyed by the function name.
+
+        refresh=True skips the lookup and stores a freshly computed value.
+        """
+        @wraps(func)
+        def wrapper(user_id, refresh=False):
+            version = self.version(user_id)
+            entry = None if refresh else self.backend.get(user_id, func.__name__)
+            value = entry[1] if entry is not None and entry[0] == version else None
+            with self._lock:
+                if value is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            if value is None:
+                value = func(user_id)
+                self.backend.set(user_id, func.__name__, [version, value])
+            return value
+        return wrapper
+
+    def invalidate(self, *user_ids):
+        for user_id in set(user_ids):
+            self.backend.delete(user_id)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': self.backend.name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+            'size': self.backend.size()
+        }
+
+analytics_cache = AnalyticsCache(version=data_version)
\ No newline at end of file
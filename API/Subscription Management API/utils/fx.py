@@ -0,0 +1,97 @@
+from datetime import datetime
+import csv
+import threading
+import time
+from models import db, ExchangeRate
+from utils.replica import replica
+from utils.versioning import bump_dataset_version, dataset_version
+
+class ExchangeRateCache:
+    """Date-keyed in-memory cache of the ExchangeRate table.
+
+    Entries are only used while the exchange rates version they were read at
+    is current, so rates loaded by another process are picked up right away.
+    """
+
+    def __init__(self, reference='USD', ttl=3600):
+        self.reference = reference
+        self.ttl = ttl
+        self._rates = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.reference = app.config.get('FX_REFERENCE_CURRENCY', 'USD')
+        self.ttl = app.config.get('FX_CACHE_TTL', 3600)
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._rates.clear()
+
+    def rates_on(self, on_date):
+        """Return {currency: rate} using each currency's latest rate on or before on_date"""
+        version = dataset_version('exchange_rates')
+        with self._lock:
+            cached = self._rates.get(on_date)
+        if cached and cached[0] > time.monotonic() and cached[1] == version:
+            return cached[2]
+
+        session = replica.session
+        latest = session.query(
+            ExchangeRate.currency,
+            db.func.max(ExchangeRate.date).label('date')
+        ).filter(ExchangeRate.date <= on_date).group_by(ExchangeRate.currency).subquery()
+        rates = dict(session.query(ExchangeRate.currency, ExchangeRate.rate).join(
+            latest,
+            db.and_(ExchangeRate.currency == latest.c.currency, ExchangeRate.date == latest.c.date)
+        ).all())
+        rates[self.reference] = 1.0
+
+        with self._lock:
+            self._rates[on_date] = (time.monotonic() + self.ttl, version, rates)
+        return rates
+
+    def conversion_factors(self, currencies, base, on_date=None):
+        """Return {currency: factor} so that amount * factor is the amount in base.
+
+        Currencies without a rate are left out (see unconverted_currencies);
+        only a base without a rate is an error.
+        """
+        rates = self.rates_on(on_date or datetime.now().date())
+        if base not in rates:
+            raise ValueError(f"No exchange rate for {base}")
+        return {code: rates[base] / rates[code] for code in set(currencies) | {base} if code in rates}
+
+def normalize_amounts(amounts_by_currency, factors):
+    """Convert a {currency: amount} mapping to a single total using precomputed factors.
+
+    Amounts in currencies without a factor are not included.
+    """
+    return round(sum(amount * factors[code] for code, amount in amounts_by_currency.items() if code in factors), 2)
+
+def unconverted_currencies(currencies, factors):
+    """Sorted currencies that normalize_amounts leaves out for lack of a rate"""
+    return sorted(code for code in set(currencies) if code not in factors)
+
+def load_exchange_rates(path):
+    """Load a date,currency,rate CSV into ExchangeRate; the file replaces the dates it contains"""
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = [
+            {
+                'date': datetime.strptime(row['date'], '%Y-%m-%d').date(),
+                'currency': row['currency'].strip().upper(),
+                'rate': float(row['rate'])
+            }
+            for row in csv.DictReader(f)
+        ]
+
+    dates = {row['date'] for row in rows}
+    if dates:
+        ExchangeRate.query.filter(ExchangeRate.date.in_(dates)).delete(synchronize_session=False)
+        db.session.execute(ExchangeRate.__table__.insert(), rows)
+        bump_dataset_version('exchange_rates')
+    db.session.commit()
+    exchange_rates.clear()
+    return len(rows)
+
+exchange_rates = ExchangeRateCache()
\ No newline at end of file
@@ -1,34 +1,207 @@
 from datetime import datetime, timedelta
-from models import Subscription
-
-def calculate_upcoming_costs(subscriptions):
-    """Calculate total upcoming monthly and yearly costs"""
-    monthly_total = 0
-    yearly_total = 0
-    
-    for sub in subscriptions:
-        if sub.status == 'active':
-            yearly_total += sub.calculate_yearly_cost()
-            if sub.frequency == 'monthly':
-                monthly_total += sub.amount
-            elif sub.frequency == 'weekly':
-                monthly_total += sub.amount * 4
-            elif sub.frequency == 'yearly':
-                # For monthly display, divide yearly by 12
-                monthly_total += sub.amount / 12
+import calendar
+from models import db, Subscription, UserSpendSummary
+from utils.cache import analytics_cache
+from utils.fx import exchange_rates, normalize_amounts, unconverted_currencies
+from utils.replica import replica
+
+FREQUENCIES = ('monthly', 'yearly', 'weekly')
+UPDATABLE_FIELDS = {'name', 'amount', 'currency', 'frequency', 'next_billing_date', 'category', 'status'}
+BUCKETS = {'day': 1, 'week': 7, 'month': 30}  # approximate days per bucket
+
+def date_bucket(column, bucket, dialect):
+    """SQL expression labelling a date column with its day (YYYY-MM-DD), week (its Monday) or month (YYYY-MM)"""
+    if dialect == 'sqlite':
+        expressions = {
+            'day': lambda: db.func.strftime('%Y-%m-%d', column),
+            'week': lambda: db.func.date(column, 'weekday 0', '-6 days'),
+            'month': lambda: db.func.strftime('%Y-%m', column)
+        }
+    elif dialect == 'postgresql':
+        expressions = {
+            'day': lambda: db.func.to_char(column, 'YYYY-MM-DD'),
+            'week': lambda: db.func.to_char(db.func.date_trunc('week', column), 'YYYY-MM-DD'),
+            'month': lambda: db.func.to_char(column, 'YYYY-MM')
+        }
+    elif dialect in ('mysql', 'mariadb'):
+        expressions = {
+            'day': lambda: db.func.date_format(column, '%Y-%m-%d'),
+            'week': lambda: db.func.date_format(db.func.subdate(column, db.func.weekday(column)), '%Y-%m-%d'),
+            'month': lambda: db.func.date_format(column, '%Y-%m')
+        }
+    else:
+        raise ValueError(f'History buckets are not supported on {dialect}')
+    
+    if bucket not in expressions:
+        raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+    return expressions[bucket]().label('period')
+
+def renewal_window(days, max_days):
+    """Return the (first, last) dates of a renewal window starting today"""
+    if days is None or not 0 < days <= max_days:
+        raise ValueError(f'days must be between 1 and {max_days}')
+    today = datetime.now().date()
+    return today, today + timedelta(days=days)
+
+def advance_billing_date(billing_date, frequency, billing_day=None):
+    """Return the billing date one period after billing_date.
+
+    billing_day is the day of the month the subscription bills on (default:
+    billing_date's day); it is clamped to shorter months only for that month.
+    """
+    if frequency == 'weekly':
+        return billing_date + timedelta(days=7)
+    
+    if frequency == 'monthly':
+        year, month = divmod(billing_date.month, 12)
+        year, month = billing_date.year + year, month + 1
+    elif frequency == 'yearly':
+        year, month = billing_date.year + 1, billing_date.month
+    else:
+        raise ValueError(f'Unknown frequency: {frequency}')
+    
+    # Clamp to the last day of shorter months (e.g. Jan 31 -> Feb 28 -> Mar 31)
+    day = min(billing_day or billing_date.day, calendar.monthrange(year, month)[1])
+    return billing_date.replace(year=year, month=month, day=day)
+
+def parse_amount(value):
+    """Coerce an amount (number or numeric string) to a non-negative float"""
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'invalid amount: {value!r}')
+    if amount < 0:
+        raise ValueError('amount must not be negative')
+    return amount
+
+def normalize_currency(value):
+    """Return a currency as a three-letter upper-case code"""
+    code = value.strip().upper() if isinstance(value, str) else ''
+    if len(code) != 3 or not (code.isascii() and code.isalpha()):
+        raise ValueError(f'invalid currency: {value!r}')
+    return code
+
+def parse_subscription_row(data):
+    """Validate an imported subscription record and return its column values"""
+    if not isinstance(data, dict):
+        raise ValueError('row must be an object')
+    
+    missing = [field for field in ('name', 'amount', 'frequency', 'next_billing_date') if data.get(field) in (None, '')]
+    if missing:
+        raise ValueError(f"missing field(s): {', '.join(missing)}")
+    
+    amount = parse_amount(data['amount'])
+    
+    frequency = data['frequency']
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"frequency must be one of {', '.join(FREQUENCIES)}")
+    
+    try:
+        next_billing_date = datetime.strptime(data['next_billing_date'], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid next_billing_date: {data['next_billing_date']!r}")
     
     return {
-        'monthly_total': round(monthly_total, 2),
-        'yearly_total': round(yearly_total, 2)
+        'name': str(data['name'])[:100],
+        'amount': amount,
+        'currency': normalize_currency(data.get('currency') or 'USD'),
+        'frequency': frequency,
+        'next_billing_date': next_billing_date,
+        'billing_day': next_billing_date.day,
+        'category': data.get('category') or 'Other',
+        'status': data.get('status') or 'active',
+        'user_id': data.get('user_id') or 'default_user'
     }
 
-def get_subscriptions_by_category(subscriptions):
-    """Group subscriptions by category"""
+def parse_subscription_changes(data):
+    """Validate the field set of a bulk update and return the column values to assign"""
+    if not isinstance(data, dict) or not data:
+        raise ValueError('set must be a non-empty object')
+    
+    unknown = sorted(set(data) - UPDATABLE_FIELDS)
+    if unknown:
+        raise ValueError(f"cannot update field(s): {', '.join(unknown)}")
+    
+    values = {}
+    for field in ('name', 'category', 'status'):
+        if field in data:
+            values[field] = None if data[field] is None and field == 'category' else str(data[field])
+    if 'name' in values:
+        values['name'] = values['name'][:100]
+    if 'currency' in data:
+        values['currency'] = normalize_currency(data['currency'])
+    if 'amount' in data:
+        values['amount'] = parse_amount(data['amount'])
+    if 'frequency' in data:
+        if data['frequency'] not in FREQUENCIES:
+            raise ValueError(f"frequency must be one of {', '.join(FREQUENCIES)}")
+        values['frequency'] = data['frequency']
+    if 'next_billing_date' in data:
+        try:
+            values['next_billing_date'] = datetime.strptime(data['next_billing_date'], '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid next_billing_date: {data['next_billing_date']!r}")
+        values['billing_day'] = values['next_billing_date'].day
+    return values
+
+@analytics_cache.memoize
+def calculate_upcoming_costs(user_id):
+    """Calculate upcoming monthly and yearly costs per currency"""
+    rows = replica.session.query(
+        UserSpendSummary.currency,
+        db.func.sum(UserSpendSummary.monthly_total),
+        db.func.sum(UserSpendSummary.yearly_total)
+    ).filter(
+        UserSpendSummary.user_id == user_id,
+        UserSpendSummary.subscription_count > 0
+    ).group_by(UserSpendSummary.currency)
+    
+    return {
+        currency: {'monthly_total': round(monthly_total, 2), 'yearly_total': round(yearly_total, 2)}
+        for currency, monthly_total, yearly_total in rows
+    }
+
+@analytics_cache.memoize
+def get_subscriptions_by_category(user_id):
+    """Summarize active subscriptions per category and currency"""
+    rows = replica.session.query(UserSpendSummary).filter(
+        UserSpendSummary.user_id == user_id,
+        UserSpendSummary.subscription_count > 0
+    ).order_by(UserSpendSummary.category, UserSpendSummary.currency)
+    
     categories = {}
-    for sub in subscriptions:
-        if sub.status == 'active':
-            category = sub.category or 'Uncategorized'
-            if category not in categories:
-                categories[category] = []
-            categories[category].append(sub.to_dict())
-    return categories
\ No newline at end of file
+    for row in rows:
+        categories.setdefault(row.category, {})[row.currency] = {
+            'count': row.subscription_count,
+            'monthly_total': round(row.monthly_total, 2)
+        }
+    return categories
+
+def summarize_spending(user_id, base, refresh=False):
+    """Return (totals, categories) with per-currency amounts and amounts normalized to base.
+
+    refresh=True recomputes instead of trusting the cache, which a lagging
+    replica may have filled (used for read-your-writes requests).
+    """
+    costs = calculate_upcoming_costs(user_id, refresh=refresh)
+    categories = get_subscriptions_by_category(user_id, refresh=refresh)
+    
+    # One rate lookup per response; every total is then a multiply per currency
+    factors = exchange_rates.conversion_factors(costs.keys(), base)
+    
+    totals = {
+        'base_currency': base,
+        'monthly_total': normalize_amounts({code: c['monthly_total'] for code, c in costs.items()}, factors),
+        'yearly_total': normalize_amounts({code: c['yearly_total'] for code, c in costs.items()}, factors),
+        'by_currency': costs,
+        'unconverted_currencies': unconverted_currencies(costs.keys(), factors)
+    }
+    summary = {
+        name: {
+            'count': sum(c['count'] for c in by_currency.values()),
+            'monthly_total': normalize_amounts({code: c['monthly_total'] for code, c in by_currency.items()}, factors),
+            'by_currency': {code: c['monthly_total'] for code, c in by_currency.items()}
+        }
+        for name, by_currency in categories.items()
+    }
+    return totals, summary
\ No newline at end of file
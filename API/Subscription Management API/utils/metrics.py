@@ -0,0 +1,132 @@
+from collections import defaultdict
+import threading
+import time
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db
+
+# Upper bounds (seconds) of the request duration histogram
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RequestMetrics:
+    """Opt-in per-endpoint request timing and SQL statement accounting, served as Prometheus text"""
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._help = {}
+        self._histograms = defaultdict(lambda: [0] * (len(DURATION_BUCKETS) + 1))
+        self._durations = defaultdict(float)
+
+    def init_app(self, app):
+        """Install the hooks; call after the database is initialized"""
+        self.enabled = app.config.get('METRICS_ENABLED', False)
+        if not self.enabled:
+            return
+        self.slow_request_seconds = app.config.get('METRICS_SLOW_REQUEST_MS', 500) / 1000
+
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(Session, 'do_orm_execute', self._count_rows)
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.render)
+
+    def inc(self, name, help_text, value=1, **labels):
+        """Increment a counter; usable by other modules (e.g. rejected requests)"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._help.setdefault(name, help_text)
+            self._counters[key] += value
+
+    def _start_request(self):
+        if request.endpoint == 'metrics':
+            return
+        # Streamed responses are measured up to the first byte; statements issued while streaming are not attributed
+        g.metrics = {'started': time.perf_counter(), 'statements': [], 'rows': 0}
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_started'].pop()
+        if has_request_context() and 'metrics' in g:
+            g.metrics['statements'].append((statement, elapsed))
+
+    def _count_rows(self, orm_execute_state):
+        # Streaming (yield_per) results are left alone so they stay streamed
+        if (not has_request_context() or 'metrics' not in g or not orm_execute_state.is_select
+                or orm_execute_state.execution_options.get('yield_per')):
+            return None
+        frozen = orm_execute_state.invoke_statement().freeze()
+        g.metrics['rows'] += len(frozen.data)
+        return frozen()
+
+    def _finish_request(self, response):
+        state = g.pop('metrics', None)
+        if state is None:
+            return response
+        elapsed = time.perf_counter() - state['started']
+        endpoint = request.endpoint or 'unmatched'
+        statements = state['statements']
+        sql_seconds = sum(duration for _, duration in statements)
+        labels = {'endpoint': endpoint, 'method': request.method}
+
+        self.inc('http_requests_total', 'Requests served', status=str(response.status_code), **labels)
+        self.inc('db_statements_total', 'SQL statements executed', len(statements), **labels)
+        self.inc('db_statement_seconds_total', 'Time spent in SQL statements', sql_seconds, **labels)
+        self.inc('db_rows_returned_total', 'Rows returned by ORM/Core queries', state['rows'], **labels)
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            bucket = next((i for i, bound in enumerate(DURATION_BUCKETS) if elapsed <= bound), len(DURATION_BUCKETS))
+            self._histograms[key][bucket] += 1
+            self._durations[key] += elapsed
+
+        if elapsed >= self.slow_request_seconds:
+            lines = '\n'.join(
+                f'  {duration * 1000:8.2f}ms  {" ".join(statement.split())[:300]}'
+                for statement, duration in statements
+            )
+            current_app.logger.warning(
+                'Slow request %s %s: %.1fms, %d statements (%.1fms SQL), %d rows\n%s',
+                request.method, request.full_path, elapsed * 1000, len(statements),
+                sql_seconds * 1000, state['rows'], lines
+            )
+        return response
+
+    def render(self):
+        """Prometheus text exposition of every metric"""
+        def format_labels(labels):
+            return ','.join(f'{name}="{value}"' for name, value in labels)
+
+        lines = []
+        with self._lock:
+            by_name = defaultdict(list)
+            for (name, labels), value in self._counters.items():
+                by_name[name].append((labels, value))
+            for name in sorted(by_name):
+                lines.append(f'# HELP {name} {self._help[name]}')
+                lines.append(f'# TYPE {name} counter')
+                for labels, value in sorted(by_name[name]):
+                    lines.append(f'{name}{{{format_labels(labels)}}} {value:g}')
+
+            name = 'http_request_duration_seconds'
+            lines.append(f'# HELP {name} Request wall time')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, counts in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{format_labels(labels)},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{format_labels(labels)}}} {self._durations[labels]:.6f}')
+                lines.append(f'{name}_count{{{format_labels(labels)}}} {cumulative}')
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+request_metrics = RequestMetrics()
\ No newline at end of file
@@ -0,0 +1,59 @@
+from sqlalchemy import inspect, select, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateIndex
+from models import db, Subscription, Transaction
+
+def _from_subscription(column, default=None):
+    """Backfill value: the column of the row's subscription (default if there is none)"""
+    subscriptions = Subscription.__table__
+
+    def value(table):
+        source = select(subscriptions.c[column]).where(subscriptions.c.id == table.c.subscription_id).scalar_subquery()
+        return db.func.coalesce(source, default) if default is not None else source
+    return value
+
+# Columns added to tables that already existed; create_all only creates missing tables.
+# Existing rows are backfilled where possible; the columns stay nullable on upgraded databases.
+ADDED_COLUMNS = [
+    (Transaction.__table__, 'user_id', _from_subscription('user_id')),
+    (Transaction.__table__, 'currency', _from_subscription('currency', 'USD')),
+    # Empty until the next billing date is set; renewals fill it in
+    (Subscription.__table__, 'billing_day', None),
+]
+
+def upgrade_schema(engine):
+    """Add missing columns and indexes to existing tables and backfill them; safe to run repeatedly.
+
+    Returns a description of every step applied.
+    """
+    applied = []
+    preparer = engine.dialect.identifier_preparer
+    for table, name, backfill in ADDED_COLUMNS:
+        if name in {column['name'] for column in inspect(engine).get_columns(table.name)}:
+            continue
+        column = table.c[name]
+        try:
+            with engine.begin() as connection:
+                connection.exec_driver_sql(
+                    f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN '
+                    f'{preparer.format_column(column)} {column.type.compile(dialect=engine.dialect)}'
+                )
+        except DBAPIError:
+            # Another worker starting up at the same time added it first
+            if name not in {column['name'] for column in inspect(engine).get_columns(table.name)}:
+                raise
+            continue
+        if backfill is not None:
+            with engine.begin() as connection:
+                connection.execute(update(table).where(column.is_(None)).values({name: backfill(table)}))
+        applied.append(f'added {table.name}.{name}')
+
+    # Indexes declared on tables that existed before them
+    for table in (Subscription.__table__, Transaction.__table__):
+        existing = {index['name'] for index in inspect(engine).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                with engine.begin() as connection:
+                    connection.execute(CreateIndex(index, if_not_exists=True))
+                applied.append(f'created index {index.name}')
+    return applied
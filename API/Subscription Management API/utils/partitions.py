@@ -0,0 +1,189 @@
+from collections import defaultdict
+from datetime import date, timedelta
+import re
+from sqlalchemy import MetaData, inspect, insert, tuple_, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateIndex, CreateTable, DropTable
+from models import db, upsert_increment, IdSequence, Subscription, Transaction, TransactionMonthSummary
+from utils.helpers import date_bucket
+
+PARTITION_NAME = re.compile(r'^transaction_(\d{4})(\d{2})$')
+
+# Partition tables are defined on demand; the subscription table is copied in
+# so their foreign keys resolve
+partition_metadata = MetaData()
+Subscription.__table__.to_metadata(partition_metadata)
+
+def month_start(day):
+    return day.replace(day=1)
+
+def next_month(month):
+    return (month_start(month) + timedelta(days=32)).replace(day=1)
+
+def partition_table(month):
+    """Table holding the transactions dated in month; same schema as Transaction"""
+    name = f'transaction_{month.year:04d}{month.month:02d}'
+    if name in partition_metadata.tables:
+        return partition_metadata.tables[name]
+    table = Transaction.__table__.to_metadata(partition_metadata, name=name)
+    # Index and constraint names are global on some databases
+    for item in (*table.indexes, *table.constraints):
+        if isinstance(item.name, str) and 'transaction' in item.name:
+            item.name = item.name.replace('transaction', name, 1)
+    return table
+
+def live_partitions(session):
+    """Return {month: table} for every partition present in the session's database, oldest first"""
+    partitions = {}
+    for name in inspect(session.connection()).get_table_names():
+        match = PARTITION_NAME.match(name)
+        if match:
+            month = date(int(match.group(1)), int(match.group(2)), 1)
+            partitions[month] = partition_table(month)
+    return dict(sorted(partitions.items()))
+
+def transaction_tables(session, start=None, end=None):
+    """Tables that can hold raw transactions dated in [start, end]: the overlapping partitions plus the legacy table"""
+    tables = [Transaction.__table__]
+    for month, table in live_partitions(session).items():
+        if (start is None or next_month(month) > start) and (end is None or month <= end):
+            tables.append(table)
+    return tables
+
+def select_transactions(session, columns, where=lambda c: (), start=None, end=None):
+    """UNION ALL of the named columns over the partitions overlapping [start, end], as a subquery.
+
+    where receives each table's columns and returns extra criteria, so filters
+    are applied inside every branch where they can use that table's indexes.
+    """
+    branches = []
+    for table in transaction_tables(session, start, end):
+        criteria = list(where(table.c))
+        if start is not None:
+            criteria.append(table.c.transaction_date >= start)
+        if end is not None:
+            criteria.append(table.c.transaction_date <= end)
+        branches.append(db.select(*(table.c[name] for name in columns)).where(*criteria))
+    return union_all(*branches).subquery('transactions')
+
+def ensure_partition(month):
+    """Create the partition for month if it does not exist yet and return it"""
+    table = partition_table(month)
+    db.session.execute(CreateTable(table, if_not_exists=True))
+    for index in table.indexes:
+        db.session.execute(CreateIndex(index, if_not_exists=True))
+    return table
+
+def reserve_transaction_ids(count):
+    """Reserve count consecutive transaction ids within the current transaction and return them.
+
+    Every partition takes its ids from one counter, so an id identifies a
+    transaction across partitions. The counter starts after the highest id
+    already stored.
+    """
+    sequence = IdSequence.__table__
+    result = db.session.execute(
+        sequence.update().where(sequence.c.name == 'transaction').values(value=sequence.c.value + count)
+    )
+    if result.rowcount == 0:
+        highest = max(
+            db.session.execute(db.select(db.func.max(table.c.id))).scalar() or 0
+            for table in transaction_tables(db.session)
+        )
+        # A concurrent first reservation is added on top, which only skips ids
+        upsert_increment(IdSequence, ['name'], [{'name': 'transaction', 'value': highest + count}], increments=('value',))
+    last = db.session.execute(db.select(sequence.c.value).where(sequence.c.name == 'transaction')).scalar()
+    return range(last - count + 1, last + 1)
+
+def _insert_new(table, batch):
+    """Insert the rows of batch whose (subscription_id, transaction_date) is not recorded yet; return how many"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert_ = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert_(table).on_conflict_do_nothing(index_elements=['subscription_id', 'transaction_date'])
+        return db.session.execute(stmt, batch).rowcount
+    
+    # Portable fallback: leave out the charges that already exist
+    keys = table.c.subscription_id, table.c.transaction_date
+    existing = set(db.session.execute(
+        db.select(*keys).where(tuple_(*keys).in_([(row['subscription_id'], row['transaction_date']) for row in batch]))
+    ).all())
+    batch = [row for row in batch if (row['subscription_id'], row['transaction_date']) not in existing]
+    if batch:
+        db.session.execute(insert(table), batch)
+    return len(batch)
+
+def insert_transactions(rows, skip_existing=False):
+    """Insert charges into their monthly partitions within the current transaction; return how many were inserted.
+
+    With skip_existing, a charge for a subscription and date that is already
+    recorded is left out instead of violating the unique constraint.
+    """
+    if not rows:
+        return 0
+    by_month = defaultdict(list)
+    for row, transaction_id in zip(rows, reserve_transaction_ids(len(rows))):
+        by_month[month_start(row['transaction_date'])].append({**row, 'id': transaction_id})
+    inserted = 0
+    for month, batch in sorted(by_month.items()):
+        if skip_existing:
+            inserted += _insert_new(ensure_partition(month), batch)
+        else:
+            db.session.execute(insert(ensure_partition(month)), batch)
+            inserted += len(batch)
+    return inserted
+
+def _compact(table, month, *criteria):
+    """Fold rows of table into TransactionMonthSummary; month is a date or a YYYY-MM SQL label"""
+    keys = (table.c.subscription_id, table.c.user_id, table.c.currency, db.func.coalesce(table.c.status, 'completed'))
+    rows = db.session.execute(
+        db.select(*keys, month, db.func.count(), db.func.sum(table.c.amount))
+        .where(*criteria)
+        .group_by(*keys, month)
+    ).all()
+    upsert_increment(
+        TransactionMonthSummary,
+        ['subscription_id', 'month', 'status', 'currency'],
+        [
+            {
+                'subscription_id': subscription_id,
+                'user_id': user_id,
+                'currency': currency,
+                'status': status,
+                'month': label if isinstance(label, date) else date(int(label[:4]), int(label[5:7]), 1),
+                'transaction_count': count,
+                'amount_total': amount or 0.0
+            }
+            for subscription_id, user_id, currency, status, label, count, amount in rows
+        ],
+        increments=('transaction_count', 'amount_total')
+    )
+    return sum(row[5] for row in rows)
+
+def archive_transactions(before):
+    """Compact every month before `before` into TransactionMonthSummary rows and drop its partition.
+
+    Each partition is summarized and dropped in one transaction, so a re-run
+    after a failure neither loses nor double counts a month.
+    """
+    before = month_start(before)
+    summary = {'partitions': 0, 'transactions': 0}
+
+    for month, table in live_partitions(db.session).items():
+        if month >= before:
+            break
+        summary['transactions'] += _compact(table, db.literal(month, db.Date))
+        db.session.execute(DropTable(table))
+        db.session.commit()
+        partition_metadata.remove(table)
+        summary['partitions'] += 1
+
+    # Charges recorded before partitioning
+    legacy = Transaction.__table__
+    dialect = db.session.get_bind().dialect.name
+    summary['transactions'] += _compact(
+        legacy, date_bucket(legacy.c.transaction_date, 'month', dialect), legacy.c.transaction_date < before
+    )
+    db.session.execute(legacy.delete().where(legacy.c.transaction_date < before))
+    db.session.commit()
+    return summary
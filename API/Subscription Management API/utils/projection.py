@@ -0,0 +1,121 @@
+from datetime import date
+import numpy as np
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Calendar months between consecutive charges; weekly is handled in days
+MONTH_STEPS = {'monthly': 1, 'yearly': 12}
+
+def _month_schedule(billing_dates, billing_days, step, first_month, last_month):
+    """Charge dates for month-based frequencies, one row per subscription.
+
+    Mirrors advance_billing_date: the billing day (0 for the day of the next
+    billing date) is clamped to each short month on its own (Jan 31 -> Feb 28
+    -> Mar 31).
+    """
+    start_month = billing_dates.astype('datetime64[M]')
+    periods = int(max(0, (last_month - start_month.min()).astype(int))) // step + 1
+    months = start_month[:, None] + step * np.arange(periods)
+    month_starts = months.astype('datetime64[D]')
+    days_in_month = ((months + 1).astype('datetime64[D]') - month_starts).astype(int)
+    billing_day = np.where(
+        billing_days > 0, billing_days, (billing_dates - start_month.astype('datetime64[D]')).astype(int) + 1
+    )
+    day = np.minimum(billing_day[:, None], days_in_month)
+    return month_starts + (day - 1)
+
+def _week_schedule(billing_dates, window_start, window_end):
+    # Start each row at its first charge inside the window so overdue dates add no columns
+    skipped = np.maximum(0, -((billing_dates - window_start).astype(int) // 7))
+    periods = int((window_end - window_start).astype(int)) // 7 + 1
+    return (billing_dates + 7 * skipped)[:, None] + 7 * np.arange(periods)
+
+def expand_charges(billing_dates, billing_days, frequencies, first_month, months):
+    """Expand billing schedules into the charges falling in a window of calendar months.
+
+    billing_dates is a datetime64[D] array of next billing dates, billing_days
+    an int array of days of the month they bill on (0 if unknown) and
+    frequencies an array of frequency names. Returns (rows, month_index):
+    the subscription row and window month (0..months-1) of every charge.
+    """
+    first_month = np.datetime64(first_month, 'M')
+    last_month = first_month + (months - 1)
+    window_start = first_month.astype('datetime64[D]')
+    window_end = (last_month + 1).astype('datetime64[D]')
+    # Month boundaries as day numbers; comparing int64 days avoids calendar conversions per charge
+    boundaries = (first_month + np.arange(months + 1)).astype('datetime64[D]').view('int64')
+
+    rows, month_index = [], []
+    for frequency in ('weekly', *MONTH_STEPS):
+        selected = np.flatnonzero(frequencies == frequency)
+        if not selected.size:
+            continue
+        if frequency == 'weekly':
+            dates = _week_schedule(billing_dates[selected], window_start, window_end)
+        else:
+            dates = _month_schedule(
+                billing_dates[selected], billing_days[selected], MONTH_STEPS[frequency], first_month, last_month
+            )
+        days = dates.view('int64')
+        row, column = np.nonzero((days >= boundaries[0]) & (days < boundaries[-1]))
+        rows.append(selected[row])
+        month_index.append(np.searchsorted(boundaries, days[row, column], side='right') - 1)
+
+    if not rows:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    return np.concatenate(rows), np.concatenate(month_index)
+
+def _factorize(values):
+    """Return (unique values, index array) without sorting strings in NumPy"""
+    codes = {}
+    index = np.fromiter((codes.setdefault(value, len(codes)) for value in values), dtype=np.intp)
+    return list(codes), index
+
+def monthly_cashflow(subscriptions, factors, first_month, months=12):
+    """Project charges per month and category, in the base currency of factors.
+
+    Charges in currencies without a factor count towards charges and
+    totals_by_currency but not towards the converted totals.
+
+    subscriptions is a sequence of (next_billing_date, billing_day, frequency,
+    amount, currency, category) tuples for active subscriptions.
+    """
+    first_month = np.datetime64(first_month, 'M')
+    labels = [str(first_month + offset) for offset in range(months)]
+    if not subscriptions:
+        return [{'month': label, 'charges': 0, 'by_category': {}, 'total': 0.0} for label in labels], {}
+
+    billing_dates, billing_days, frequencies, amounts, currencies, categories = zip(*subscriptions)
+    # Converting date objects via their ordinals is far faster than letting NumPy parse them
+    billing_dates = (np.array([d.toordinal() for d in billing_dates]) - EPOCH_ORDINAL).astype('datetime64[D]')
+    billing_days = np.array([day or 0 for day in billing_days])
+    frequencies = np.array(frequencies)
+    currency_names, currency_index = _factorize(currencies)
+    category_names, category_index = _factorize(c or 'Uncategorized' for c in categories)
+    amounts = np.array(amounts, dtype=float)
+    converted = amounts * np.array([factors.get(code, 0.0) for code in currency_names])[currency_index]
+
+    rows, month_index = expand_charges(billing_dates, billing_days, frequencies, first_month, months)
+
+    cells = month_index * len(category_names) + category_index[rows]
+    by_category = np.bincount(cells, weights=converted[rows], minlength=months * len(category_names))
+    by_category = by_category.reshape(months, len(category_names))
+    charges = np.bincount(month_index, minlength=months)
+    by_currency = np.bincount(currency_index[rows], weights=amounts[rows], minlength=len(currency_names))
+
+    projection = [
+        {
+            'month': label,
+            'charges': int(charges[m]),
+            'by_category': {
+                name: round(float(amount), 2)
+                for name, amount in zip(category_names, by_category[m]) if amount
+            },
+            'total': round(float(by_category[m].sum()), 2)
+        }
+        for m, label in enumerate(labels)
+    ]
+    totals_by_currency = {
+        code: round(float(amount), 2) for code, amount in zip(currency_names, by_currency) if amount
+    }
+    return projection, totals_by_currency
@@ -0,0 +1,137 @@
+from collections import OrderedDict
+from functools import wraps
+import math
+import threading
+import time
+from flask import current_app, jsonify, request
+from utils.metrics import request_metrics
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+class MemoryBucketStore:
+    """In-process token buckets; least recently used keys are dropped past max_keys"""
+
+    name = 'memory'
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1):
+        """Take cost tokens; return 0 if allowed, otherwise the seconds until they are available"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            retry_after = 0 if tokens >= cost else (cost - tokens) / rate
+            if not retry_after:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+class RedisBucketStore:
+    """Token buckets shared by every worker, updated atomically by a Lua script"""
+
+    name = 'redis'
+
+    # Uses the server clock so workers with skewed clocks agree
+    SCRIPT = """
+    local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or burst
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+    local retry_after = 0
+    if tokens >= cost then tokens = tokens - cost else retry_after = (cost - tokens) / rate end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return tostring(retry_after)
+    """
+
+    def __init__(self, url, prefix='subscriptions:ratelimit:'):
+        if redis is None:
+            raise RuntimeError('RATE_LIMIT_STORAGE_URL is set but the redis package is not installed')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.client.register_script(self.SCRIPT)
+
+    def take(self, key, rate, burst, cost=1):
+        return float(self._take(keys=[self.prefix + key], args=[rate, burst, cost]))
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+class RateLimiter:
+    """Token-bucket admission control per user and route"""
+
+    def __init__(self, store=None):
+        self.store = store or MemoryBucketStore()
+        self.enabled = True
+        self.rate = 5.0
+        self.burst = 20
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RATE_LIMIT_ENABLED', True)
+        self.rate = app.config.get('RATE_LIMIT_RATE', 5.0)
+        self.burst = app.config.get('RATE_LIMIT_BURST', 20)
+        url = app.config.get('RATE_LIMIT_STORAGE_URL')
+        if url:
+            self.store = RedisBucketStore(url)
+        else:
+            self.store = MemoryBucketStore(max_keys=app.config.get('RATE_LIMIT_MAX_KEYS', 100000))
+
+    def _user_key(self, user_id=None):
+        """The user a request acts for: user_id if known, ?user_id=, the JSON body's user_id or filter.user_id, else the client address"""
+        user_id = user_id or request.args.get('user_id')
+        if not user_id:
+            body = request.get_json(silent=True)
+            if isinstance(body, dict):
+                user_id = body.get('user_id') or (body.get('filter') or {}).get('user_id')
+        return f'user:{user_id}' if user_id else f'addr:{request.remote_addr}'
+
+    def limit(self, view=None, rate=None, burst=None, user=None):
+        """Reject requests over the user's budget for this route with 429 and Retry-After.
+
+        user, if given, is called with the view arguments and returns the user
+        the request acts on (e.g. a subscription's owner), or None if unknown.
+        """
+        if view is None:
+            return lambda view: self.limit(view, rate=rate, burst=burst, user=user)
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return view(*args, **kwargs)
+            key = f'{request.endpoint}:{self._user_key(user(**kwargs) if user else None)}'
+            try:
+                retry_after = self.store.take(key, rate or self.rate, burst or self.burst)
+            except Exception:
+                # A shared store outage must not take the API down with it
+                current_app.logger.exception('Rate limit store unavailable; admitting request')
+                retry_after = 0
+            if retry_after:
+                request_metrics.inc(
+                    'rate_limit_rejections_total', 'Requests rejected by the rate limiter',
+                    endpoint=request.endpoint, method=request.method
+                )
+                response = jsonify({'error': 'Too many requests', 'retry_after': round(retry_after, 3)})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(math.ceil(retry_after))
+                return response
+            return view(*args, **kwargs)
+        return wrapper
+
+rate_limiter = RateLimiter()
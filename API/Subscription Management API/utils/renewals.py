@@ -0,0 +1,96 @@
+from datetime import date
+from sqlalchemy import bindparam, tuple_
+from sqlalchemy.exc import IntegrityError
+from models import db, Subscription
+from utils.helpers import FREQUENCIES, advance_billing_date
+from utils.partitions import insert_transactions
+from utils.versioning import bump_data_versions
+
+def _due_chunk(cutoff, after, chunk_size):
+    """Fetch the next chunk of due subscriptions as plain tuples, ordered by (next_billing_date, id).
+
+    after is the (next_billing_date, id) of the last row of the previous chunk;
+    paging in index order makes every chunk a range seek on the
+    (status, next_billing_date) index instead of a sort of all remaining due rows.
+    """
+    return db.session.query(
+        Subscription.id,
+        Subscription.user_id,
+        Subscription.amount,
+        Subscription.currency,
+        Subscription.frequency,
+        Subscription.next_billing_date,
+        Subscription.billing_day
+    ).filter(
+        Subscription.status == 'active',
+        Subscription.next_billing_date <= cutoff,
+        Subscription.frequency.in_(FREQUENCIES),
+        tuple_(Subscription.next_billing_date, Subscription.id) > after
+    ).order_by(Subscription.next_billing_date, Subscription.id).limit(chunk_size).all()
+
+def renew_due_subscriptions(cutoff, chunk_size=1000):
+    """Charge every active subscription due on or before cutoff and move its billing date forward.
+
+    Each chunk is one transaction: the charges are inserted with one executemany
+    per monthly partition and the billing dates advanced with one executemany UPDATE.
+    Re-running is safe: renewed subscriptions are no longer due, a chunk that
+    failed was rolled back, and a charge already recorded for a billing date
+    (e.g. after next_billing_date was moved back) is skipped, not repeated.
+    """
+    table = Subscription.__table__
+    advance = table.update().where(
+        table.c.id == bindparam('subscription_id'),
+        # Skip rows another worker renewed since this chunk was read
+        table.c.next_billing_date == bindparam('billing_date')
+    ).values(next_billing_date=bindparam('new_billing_date'), billing_day=bindparam('billing_day'))
+
+    summary = {'chunks': 0, 'subscriptions': 0, 'transactions': 0, 'failed_chunks': 0}
+    after = (date.min, 0)
+
+    while True:
+        chunk = _due_chunk(cutoff, after, chunk_size)
+        if not chunk:
+            break
+        after = (chunk[-1].next_billing_date, chunk[-1].id)
+
+        charges, updates = [], []
+        for subscription_id, user_id, amount, currency, frequency, billing_date, billing_day in chunk:
+            # Rows from before billing_day existed bill on their current day from now on
+            billing_day = billing_day or billing_date.day
+            # Catch up on every billing date missed up to the cutoff
+            next_date = billing_date
+            while next_date <= cutoff:
+                charges.append({
+                    'subscription_id': subscription_id,
+                    'user_id': user_id,
+                    'currency': currency or 'USD',
+                    'amount': amount,
+                    'transaction_date': next_date,
+                    'status': 'completed'
+                })
+                next_date = advance_billing_date(next_date, frequency, billing_day)
+            updates.append({
+                'subscription_id': subscription_id,
+                'billing_date': billing_date,
+                'new_billing_date': next_date,
+                'billing_day': billing_day
+            })
+
+        try:
+            inserted = insert_transactions(charges, skip_existing=True)
+            db.session.execute(advance, updates)
+            bump_data_versions(*(row.user_id for row in chunk))
+            db.session.commit()
+        except IntegrityError:
+            # Raced with another worker on these subscriptions; leave them for the next run
+            db.session.rollback()
+            summary['failed_chunks'] += 1
+            continue
+        finally:
+            db.session.expunge_all()
+
+        summary['chunks'] += 1
+        summary['subscriptions'] += len(updates)
+        summary['transactions'] += inserted
+
+    return summary
\ No newline at end of file
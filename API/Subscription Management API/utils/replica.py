@@ -0,0 +1,49 @@
+from functools import wraps
+from flask import g, request
+from sqlalchemy.orm import Session
+from models import db
+
+class ReadReplica:
+    """Routes read-only requests to an optional replica database"""
+
+    def __init__(self):
+        self.enabled = False
+
+    def init_app(self, app):
+        # Must run before db.init_app so the replica engine is created as a bind
+        url = app.config.get('SQLALCHEMY_REPLICA_URI')
+        self.enabled = bool(url)
+        if self.enabled:
+            app.config['SQLALCHEMY_BINDS'] = {**app.config.get('SQLALCHEMY_BINDS', {}), 'replica': url}
+        app.teardown_appcontext(self._close_session)
+
+    def read_only(self, view):
+        """Mark a route as safe to serve from the replica"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.read_only = True
+            return view(*args, **kwargs)
+        return wrapper
+
+    def wants_primary(self):
+        """Per-request override for read-your-writes: X-Read-Your-Writes header or ?consistency=primary"""
+        return (
+            request.headers.get('X-Read-Your-Writes', '').lower() in ('1', 'true', 'yes')
+            or request.args.get('consistency') == 'primary'
+        )
+
+    @property
+    def session(self):
+        """Session for reads: the replica inside read-only routes, otherwise db.session"""
+        if not self.enabled or not g.get('read_only') or self.wants_primary():
+            return db.session
+        if 'replica_session' not in g:
+            g.replica_session = Session(bind=db.engines['replica'])
+        return g.replica_session
+
+    def _close_session(self, exc):
+        session = g.pop('replica_session', None)
+        if session is not None:
+            session.close()
+
+replica = ReadReplica()
\ No newline at end of file
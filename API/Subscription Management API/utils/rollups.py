@@ -0,0 +1,134 @@
+from collections import defaultdict
+from datetime import datetime
+from models import db, monthly_cost_expression, upsert_increment, yearly_cost_expression, Subscription, UserSpendSummary
+
+# Totals that differ by less than this are rounding noise, not drift
+DRIFT_TOLERANCE = 0.005
+
+def spend_contribution(subscription):
+    """Return what a subscription adds to its user's rollup, or None if it is not active"""
+    if subscription.status != 'active':
+        return None
+    return (
+        subscription.user_id,
+        subscription.category or 'Uncategorized',
+        subscription.currency or 'USD',
+        subscription.monthly_cost,
+        subscription.yearly_cost
+    )
+
+def matching_contributions(criteria, values=None):
+    """Return grouped contributions of the subscriptions matching criteria.
+
+    With values, the contributions are those the rows would have once values
+    were applied, computed by the database before the UPDATE runs. Each entry
+    carries the number of subscriptions it covers as a sixth element.
+    """
+    values = values or {}
+    if values.get('status', 'active') != 'active':
+        return []
+
+    def column(name):
+        return db.literal(values[name]) if name in values else getattr(Subscription, name)
+
+    category = db.func.coalesce(column('category'), 'Uncategorized')
+    currency = db.func.coalesce(column('currency'), 'USD')
+    status = Subscription.status == 'active' if 'status' not in values else db.true()
+    return db.session.query(
+        Subscription.user_id,
+        category,
+        currency,
+        db.func.sum(monthly_cost_expression(column('amount'), column('frequency'))),
+        db.func.sum(yearly_cost_expression(column('amount'), column('frequency'))),
+        db.func.count(Subscription.id)
+    ).filter(*criteria, status).group_by(Subscription.user_id, category, currency).all()
+
+def apply_spend_deltas(added=(), removed=()):
+    """Fold subscription contributions into UserSpendSummary within the current transaction"""
+    deltas = defaultdict(lambda: [0, 0.0, 0.0])
+    for sign, contributions in ((1, added), (-1, removed)):
+        for contribution in contributions:
+            if contribution is None:
+                continue
+            # Grouped contributions (see matching_contributions) end with their row count
+            user_id, category, currency, monthly, yearly, *count = contribution
+            delta = deltas[(user_id, category, currency)]
+            delta[0] += sign * (count[0] if count else 1)
+            delta[1] += sign * monthly
+            delta[2] += sign * yearly
+
+    now = datetime.utcnow()
+    params = [
+        {
+            'user_id': user_id,
+            'category': category,
+            'currency': currency,
+            'subscription_count': count,
+            'monthly_total': monthly,
+            'yearly_total': yearly,
+            'updated_at': now
+        }
+        for (user_id, category, currency), (count, monthly, yearly) in deltas.items()
+        if count or monthly or yearly
+    ]
+    upsert_increment(
+        UserSpendSummary,
+        ['user_id', 'category', 'currency'],
+        params,
+        increments=('subscription_count', 'monthly_total', 'yearly_total')
+    )
+
+def rebuild_spend_summaries(dry_run=False):
+    """Recompute every rollup from Subscription and return the rows that had drifted"""
+    category = db.func.coalesce(Subscription.category, 'Uncategorized')
+    currency = db.func.coalesce(Subscription.currency, 'USD')
+    expected = {
+        (user_id, name, code): (count, monthly or 0.0, yearly or 0.0)
+        for user_id, name, code, count, monthly, yearly in db.session.query(
+            Subscription.user_id,
+            category,
+            currency,
+            db.func.count(Subscription.id),
+            db.func.sum(Subscription.monthly_cost),
+            db.func.sum(Subscription.yearly_cost)
+        ).filter(Subscription.status == 'active').group_by(Subscription.user_id, category, currency)
+    }
+    stored = {
+        (row.user_id, row.category, row.currency): (row.subscription_count, row.monthly_total, row.yearly_total)
+        for row in UserSpendSummary.query
+        if row.subscription_count
+    }
+
+    drift = []
+    for key in sorted(expected.keys() | stored.keys()):
+        want = expected.get(key, (0, 0.0, 0.0))
+        have = stored.get(key, (0, 0.0, 0.0))
+        if want[0] != have[0] or any(abs(w - h) > DRIFT_TOLERANCE for w, h in zip(want[1:], have[1:])):
+            drift.append({
+                'user_id': key[0],
+                'category': key[1],
+                'currency': key[2],
+                'expected': {'subscription_count': want[0], 'monthly_total': round(want[1], 2), 'yearly_total': round(want[2], 2)},
+                'stored': {'subscription_count': have[0], 'monthly_total': round(have[1], 2), 'yearly_total': round(have[2], 2)}
+            })
+
+    if not dry_run:
+        now = datetime.utcnow()
+        UserSpendSummary.query.delete()
+        rows = [
+            {
+                'user_id': user_id,
+                'category': name,
+                'currency': code,
+                'subscription_count': count,
+                'monthly_total': monthly,
+                'yearly_total': yearly,
+                'updated_at': now
+            }
+            for (user_id, name, code), (count, monthly, yearly) in expected.items()
+        ]
+        if rows:
+            db.session.execute(UserSpendSummary.__table__.insert(), rows)
+        db.session.commit()
+
+    return drift
\ No newline at end of file
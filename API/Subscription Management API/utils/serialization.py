@@ -0,0 +1,36 @@
+from flask import Response, current_app
+from sqlalchemy import Date, DateTime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def compile_row_serializer(columns):
+    """Build a function turning a result tuple for `columns` into a dict.
+
+    The function is generated as a single dict literal so each row costs one
+    call with no per-field loop; date and datetime columns are isoformatted.
+    """
+    fields = []
+    for index, column in enumerate(columns):
+        value = f'row[{index}]'
+        if isinstance(column.type, (Date, DateTime)):
+            value = f'({value}.isoformat() if {value} is not None else None)'
+        fields.append(f'{column.key!r}: {value}')
+    source = f"lambda row: {{{', '.join(fields)}}}"
+    return eval(compile(source, f'<serializer {columns[0].table.name}>', 'eval'))
+
+def dumps(payload):
+    """Encode JSON with orjson when installed, otherwise the standard library"""
+    if orjson is not None:
+        return orjson.dumps(payload).decode('utf-8')
+    return current_app.json.dumps(payload)
+
+def json_response(payload, status=200):
+    """Like jsonify, but encoded with orjson when it is installed"""
+    if orjson is None:
+        response = current_app.json.response(payload)
+        response.status_code = status
+        return response
+    return Response(orjson.dumps(payload), status=status, mimetype='application/json')
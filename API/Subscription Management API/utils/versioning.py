@@ -0,0 +1,66 @@
+from datetime import datetime
+from functools import wraps
+import hashlib
+from flask import g, has_request_context, make_response, request
+from models import upsert_increment, DatasetVersion, UserDataVersion
+from utils.replica import replica
+
+def bump_data_versions(*user_ids):
+    """Advance the data version of each user within the current transaction"""
+    now = datetime.utcnow()
+    upsert_increment(
+        UserDataVersion,
+        ['user_id'],
+        [{'user_id': user_id, 'version': 1, 'updated_at': now} for user_id in sorted(set(user_ids))],
+        increments=('version',)
+    )
+
+def data_version(user_id):
+    """Data version of a user, read once per request so the ETag and cached results agree"""
+    versions = g.setdefault('data_versions', {}) if has_request_context() else {}
+    if user_id not in versions:
+        row = replica.session.get(UserDataVersion, user_id)
+        versions[user_id] = row.version if row else 0
+    return versions[user_id]
+
+def bump_dataset_version(name):
+    """Advance the version of a shared dataset within the current transaction"""
+    upsert_increment(
+        DatasetVersion, ['name'], [{'name': name, 'version': 1, 'updated_at': datetime.utcnow()}], increments=('version',)
+    )
+
+def dataset_version(name):
+    """Version of a shared dataset, read once per request like data_version"""
+    versions = g.setdefault('dataset_versions', {}) if has_request_context() else {}
+    if name not in versions:
+        row = replica.session.get(DatasetVersion, name)
+        versions[name] = row.version if row else 0
+    return versions[name]
+
+def conditional_get(view):
+    """Answer If-None-Match with 304 when the user's data version is unchanged.
+
+    The ETag covers the data version, the exchange rates version (converted
+    totals change when rates are loaded), the full request path (so each page,
+    filter and base currency gets its own tag) and today's date, since some
+    responses are relative to today.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        user_id = request.args.get('user_id', 'default_user')
+        version = data_version(user_id)
+        rates_version = dataset_version('exchange_rates')
+        etag = hashlib.sha1(
+            f'{user_id}:{version}:{rates_version}:{request.full_path}:{datetime.now().date()}'.encode('utf-8')
+        ).hexdigest()
+
+        if etag in request.if_none_match:
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            response.set_etag(etag)
+        return response
+    return wrapper
\ No newline at end of file